@@ -5,6 +5,9 @@ Author: Samuel Ahuno
 Date: 2026-03-02
 Purpose: Scaffold a lean, parameterized project directory with useful starter
          files (.gitignore, sample_sheet.tsv, config.yaml) instead of empty READMEs.
+         Reference paths for --genome (aliases like GRCh38 -> hg38 included) are
+         filled into config.yaml from profiles/databases/databases_config.yaml,
+         with each file and its index (.fai, .tbi/.csi) checked up front.
 
 Usage:
     # Scaffold into the current directory (uses cwd name as project name):
@@ -12,12 +15,21 @@ Usage:
 
     # Override name to create a new subdirectory:
     python init_project.py --name my_project --type analysis --genome hg38
+
+    # Snakemake pipeline whose profiles/slurm/config.yaml is sized from models
+    # (model.yaml + --model-rule, or a snakemake_bench_ingest.py output dir):
+    python init_project.py --name my_pipe --type pipeline --engine snakemake \
+        --genome hg38 --resource-model smk_models/
 """
 
 import argparse
+import csv
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from statistics import median
 
 # ---------------------------------------------------------------------------
 # Valid genome builds (mirrors CLAUDE.md §2)
@@ -28,6 +40,16 @@ VALID_GENOMES = [
     "t2t", "chm13",
 ]
 
+# --genome value -> key under reference_genomes.local in databases_config.yaml
+GENOME_ALIASES = {
+    "GRCh38": "hg38",
+    "hg19": "GRCh37",
+    "GRCm39": "mm39",
+    "t2t": "t2t_CHM13v2_plusY",
+    "chm13": "t2t_CHM13v2_plusY",
+}
+DATABASES_CONFIG = Path(__file__).resolve().parent.parent / "profiles/databases/databases_config.yaml"
+
 PROJECT_TYPES = ["analysis", "pipeline", "ml"]
 WORKFLOW_ENGINES = ["snakemake", "nextflow"]
 
@@ -189,7 +211,7 @@ def _sample_sheet_content():
     return "patient\tsample\tcondition\tassay\tpath\tgenome\n"
 
 
-def _config_content(project_name, genome, project_type):
+def _config_content(project_name, genome, project_type, references=None):
     """Starter config.yaml.
 
     Parameters
@@ -197,6 +219,9 @@ def _config_content(project_name, genome, project_type):
     project_name : str
     genome : str
     project_type : str
+    references : dict or None
+        Output of :func:`resolve_references`; None leaves the reference
+        paths as commented placeholders.
 
     Returns
     -------
@@ -216,12 +241,7 @@ project_type: "{project_type}"
 # Derive FIGDIR and LOGDIR from this in Snakefile; never add separate keys.
 output_dir: "results/"
 
-# Reference paths — load from profiles/databases/databases_config.yaml
-# Uncomment and fill for your genome build:
-# reference_fasta: ""
-# reference_gtf: ""
-# chrom_sizes: ""
-
+{_references_block(references)}
 # Sample sheet
 sample_sheet: "sample_sheet.tsv"
 
@@ -230,6 +250,29 @@ seed: 42
 """
 
 
+def _references_block(references):
+    """config.yaml lines for resolved reference paths (see resolve_references)."""
+    if not references:
+        return """\
+# Reference paths — load from profiles/databases/databases_config.yaml
+# Uncomment and fill for your genome build:
+# reference_fasta: ""
+# reference_gtf: ""
+# chrom_sizes: ""
+"""
+    lines = [f"# Reference paths — resolved from {references['source']} "
+             f"({references['genome']} -> {references['build']})"]
+    extra = []
+    for key, info in references["resources"].items():
+        note = f"  # {info['problem']}" if info["problem"] else ""
+        line = f'{REFERENCE_KEYS.get(key, key)}: "{info["path"]}"{note}'
+        (lines if key in REFERENCE_KEYS else extra).append(line)
+    if extra:
+        lines.append("references:")
+        lines += [f"  {line}" for line in extra]
+    return "\n".join(lines) + "\n"
+
+
 def _readme_content(project_name, genome, project_type):
     """Top-level README.md.
 
@@ -287,11 +330,330 @@ mkdir -p results/$(date +%Y%m%d)_{genome}_<description>/figures/{{png,pdf,svg}}
 """
 
 
+# ---------------------------------------------------------------------------
+# Reference resolution (profiles/databases/databases_config.yaml)
+# ---------------------------------------------------------------------------
+
+# databases_config.yaml resource key -> top-level config.yaml key
+REFERENCE_KEYS = {"fasta": "reference_fasta", "gtf": "reference_gtf", "sizes": "chrom_sizes"}
+FASTA_SUFFIXES = (".fa", ".fasta", ".fna", ".fa.gz", ".fasta.gz")
+TABIX_SUFFIXES = (".bed.gz", ".vcf.gz", ".bedgraph.gz", ".gff.gz", ".gff3.gz")
+
+
+def _check_reference(path):
+    """Problem with one reference path, or '' if it and its index are in place.
+
+    FASTA needs ``.fai``; bgzipped BED/VCF/GFF need ``.tbi`` or ``.csi``.
+    Remote (``s3://``, ``https://``) paths are not checked.
+    """
+    if "://" in path:
+        return ""
+    if not os.path.exists(path):
+        return "MISSING"
+    name = path.lower()
+    if name.endswith(FASTA_SUFFIXES) and not os.path.exists(path + ".fai"):
+        return "no .fai index"
+    if name.endswith(TABIX_SUFFIXES) and not any(os.path.exists(path + ext)
+                                                 for ext in (".tbi", ".csi")):
+        return "no .tbi/.csi index"
+    return ""
+
+
+def resolve_references(genome, config_path=DATABASES_CONFIG, threads=16):
+    """Look up a genome build's resources in databases_config.yaml.
+
+    Parameters
+    ----------
+    genome : str
+        --genome value; aliases (GRCh38, t2t, ...) map via GENOME_ALIASES.
+    config_path : Path
+        databases_config.yaml.
+    threads : int
+        Paths (and their indexes) are checked in parallel — NFS stats are slow.
+
+    Returns
+    -------
+    dict or None
+        {'source', 'genome', 'build', 'resources': {key: {'path', 'problem'}}},
+        or None when the config, PyYAML or the build is unavailable.
+    """
+    config_path = Path(config_path)
+    if not config_path.exists():
+        print(f"WARNING: {config_path} not found; reference paths left blank", file=sys.stderr)
+        return None
+    try:
+        import yaml
+    except ImportError:
+        print("WARNING: PyYAML not installed; reference paths left blank", file=sys.stderr)
+        return None
+    local = ((yaml.safe_load(config_path.read_text()) or {}).get("reference_genomes") or {}) \
+        .get("local") or {}
+    by_lower = {k.lower(): k for k in local}
+    wanted = GENOME_ALIASES.get(genome, genome)
+    build = by_lower.get(wanted.lower()) or by_lower.get(genome.lower())
+    if build is None:
+        print(f"WARNING: {genome} not in {config_path} (have: {', '.join(local)}); "
+              "reference paths left blank", file=sys.stderr)
+        return None
+    paths = {k: str(v) for k, v in (local[build] or {}).items() if v}
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        problems = dict(zip(paths, ex.map(_check_reference, paths.values())))
+    resources = {k: {"path": paths[k], "problem": problems[k]} for k in paths}
+    if paths and all(p == "MISSING" for p in problems.values()):
+        print(f"WARNING: none of the {len(paths)} {build} reference paths exist on this host",
+              file=sys.stderr)
+    else:
+        for key, info in resources.items():
+            if info["problem"]:
+                print(f"WARNING: {build} {key}: {info['path']} ({info['problem']})",
+                      file=sys.stderr)
+    return {"source": str(config_path), "genome": genome, "build": build,
+            "resources": resources}
+
+
+# ---------------------------------------------------------------------------
+# Resource-sized SLURM profile (from runtime-resource-study models)
+# ---------------------------------------------------------------------------
+
+SHORT_PARTITION = "cpushort"       # 2 h limit, usually idle nodes (rules/mskcc_partitions.md)
+SHORT_LIMIT_MIN = 120
+LONG_PARTITION = "componc_cpu"
+DEFAULT_MARGIN = 1.3               # predict_resources.DEFAULT_MARGIN
+MIN_RUNTIME_MIN = 5
+MIN_MEM_MB = 1000
+
+
+def _load_yaml(path):
+    """Read a YAML file; PyYAML is only needed for --resource-model."""
+    try:
+        import yaml
+    except ImportError:
+        print("ERROR: --resource-model needs PyYAML (pip install pyyaml)", file=sys.stderr)
+        sys.exit(1)
+    return yaml.safe_load(Path(path).read_text())
+
+
+# The two helpers below are copies of safety_ratio / bytes_per_record_from_model in
+# skills/runtime-resource-study/scripts/predict_resources.py (that module needs PyYAML
+# at import time; this script must run on the stdlib). Keep them in step.
+
+def _safety_ratio(model, key, quantile, wall_model=None):
+    """Copy of predict_resources.safety_ratio: calibration obs/pred ratio at quantile,
+    from the wall model's own section when it has one."""
+    qd = ((model.get(wall_model) or {}).get(key) if wall_model else None) \
+        or (model.get("prediction_intervals") or {}).get(key) or {}
+    return qd.get(f"q{int(round(quantile * 100))}", DEFAULT_MARGIN)
+
+
+def _bytes_per_record(model):
+    """Copy of predict_resources.bytes_per_record_from_model: median input bytes per
+    record over the model's validation runs, or None."""
+    obs = (model.get("validation") or {}).get("observations") or []
+    ratios = [o["file_size_bytes"] / o["n_primary"] for o in obs
+              if o.get("n_primary") and o.get("file_size_bytes")]
+    return median(ratios) if ratios else None
+
+
+def _load_resource_models(path, rule=None):
+    """Collect (rule, model, size_unit) from a model.yaml or a model directory.
+
+    Parameters
+    ----------
+    path : str
+        A fit_model.py model.yaml (needs ``rule``), or a directory written by
+        snakemake_bench_ingest.py (its rules.tsv lists one model per rule).
+    rule : str or None
+        Rule the single model.yaml applies to.
+
+    Returns
+    -------
+    list[tuple[str, dict, str]]
+        size_unit is 'records' or 'bytes' (what N in the model counts).
+    """
+    path = Path(path)
+    if path.is_file():
+        if not rule:
+            print("ERROR: --model-rule is required with a single model.yaml", file=sys.stderr)
+            sys.exit(1)
+        return [(rule, _load_yaml(path), "records")]
+    index = path / "rules.tsv"
+    if not index.exists():
+        print(f"ERROR: {path} is neither a model.yaml nor a directory with rules.tsv",
+              file=sys.stderr)
+        sys.exit(1)
+    models = []
+    with index.open(newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            if row.get("status") != "fit":
+                continue
+            model_path = Path(row["model"])
+            if not model_path.exists():
+                model_path = path / model_path.name
+            models.append((row["rule"], _load_yaml(model_path), row.get("size_unit") or "records"))
+    return models
+
+
+def _rule_resources(model, size_unit, quantile, bytes_per_record=None):
+    """set-resources entry for one rule, or None if it can't be sized.
+
+    runtime (minutes) and mem_mb_per_cpu are emitted as expressions Snakemake
+    evaluates per job with ``input``, ``threads`` and ``attempt`` in scope, so
+    requests scale with the job's input size and grow on each retry. Model
+    coefficients, the safety quantile and any thread-scaling factor are folded
+    into two constants per resource: request = a + k * input.size_mb.
+    """
+    if size_unit == "bytes":
+        n_per_mb = 1024 ** 2
+    else:
+        bpr = bytes_per_record or _bytes_per_record(model)
+        if not bpr:
+            return None
+        n_per_mb = 1024 ** 2 / bpr
+
+    wall_name = model.get("recommended_model", "wall_model_v1")
+    wm = model.get(wall_name) or model["wall_model_v1"]
+    wall_a = wm["a_seconds"]
+    wall_k = wm["b_us_per_record"] * 1e-6 * n_per_mb
+    if wall_name == "wall_model_v2":
+        wall_k += wm["c_seconds_per_GB"] / 1024
+    threads = None
+    joint, ts = model.get("joint_wall_model"), model.get("thread_scaling")
+    if joint and ts:
+        threads = joint["recommended_threads"]
+        g = (ts["serial_fraction"] + ts["parallel_fraction"] / threads
+             + ts["contention"] * (threads - 1))
+        wall_a *= g / joint["g_threads_calib"]
+        wall_k *= g / joint["g_threads_calib"]
+    w = _safety_ratio(model, "wall_ratio", quantile, wall_name) / 60
+    run_a, run_k = wall_a * w, wall_k * w
+
+    # In-memory line when a spill breakpoint was found: sizing to it avoids spilling,
+    # so the runtime above needs no spill_wall_penalty term
+    pw = model.get("rss_model_piecewise") or {}
+    if pw.get("breakpoint_detected"):
+        rss_a, rss_b = pw["a_mem_GB"], pw["b_mem_bytes_per_record"]
+    else:
+        rss_a, rss_b = model["rss_model"]["a_GB"], model["rss_model"]["b_bytes_per_record"]
+    r = _safety_ratio(model, "rss_ratio", quantile)
+    mem_a = max(rss_a, 0.1) * 1024 * r
+    mem_k = rss_b * n_per_mb / 1024 ** 2 * r
+
+    runtime = f"max({MIN_RUNTIME_MIN}, int(({run_a:.4g} + {run_k:.4g} * input.size_mb) * attempt) + 1)"
+    entry = {
+        "runtime": runtime,
+        "mem_mb_per_cpu": (f"max({MIN_MEM_MB}, int(({mem_a:.4g} + {mem_k:.4g} * input.size_mb)"
+                           f" * attempt / threads) + 1)"),
+        "slurm_partition": (f"'{SHORT_PARTITION}' if {runtime} <= {SHORT_LIMIT_MIN}"
+                            f" else '{LONG_PARTITION}'"),
+    }
+    if threads:
+        entry["cpus_per_task"] = threads
+    return entry, threads
+
+
+def _profile_content(rule_resources, source, quantile):
+    """Workflow SLURM profile (Tier 3 layout) with per-rule set-resources.
+
+    Parameters
+    ----------
+    rule_resources : dict[str, tuple[dict, int or None]]
+        Rule -> (set-resources entry, recommended threads).
+    source : str
+        Model file or directory, recorded in the header.
+    quantile : float
+        Safety quantile the requests were sized at.
+
+    Returns
+    -------
+    str
+        YAML content.
+    """
+    lines = [
+        "# SLURM workflow profile — generated by init_project.py",
+        f"# Date: {datetime.now().strftime('%Y-%m-%d')}",
+        f"# Resources: {source} (q{int(round(quantile * 100))} safety margin)",
+        "#",
+        "# runtime / mem_mb_per_cpu / slurm_partition are Python expressions Snakemake",
+        "# evaluates per job (input, threads, attempt in scope): requests scale with input",
+        "# size and grow on retry. Re-run init_project.py --profile-only after refitting.",
+        "#",
+        "# Snakemake 9 conventions: mem_mb: 0 in default-resources, mem_mb_per_cpu",
+        "# everywhere, slurm_account set.",
+        "",
+        "executor: slurm",
+        "",
+        "default-resources:",
+        f'    slurm_partition: "{LONG_PARTITION}"',
+        '    slurm_account: "greenbab"',
+        "    mem_mb: 0",
+        "    mem_mb_per_cpu: 4000",
+        "    cpus_per_task: 1",
+        "    nodes: 1",
+        "    runtime: 60",
+        "",
+        "set-resources:",
+    ]
+    for rule, (entry, _) in sorted(rule_resources.items()):
+        lines.append(f"    {rule}:")
+        for key, value in entry.items():
+            lines.append(f'        {key}: "{value}"' if isinstance(value, str)
+                         else f"        {key}: {value}")
+    threaded = {r: t for r, (_, t) in rule_resources.items() if t}
+    if threaded:
+        lines += ["", "set-threads:"]
+        lines += [f"    {r}: {t}" for r, t in sorted(threaded.items())]
+    lines += [
+        "",
+        "jobs: unlimited",
+        "keep-incomplete: true",
+        "printshellcmds: true",
+        "latency-wait: 360",
+        "max-status-checks-per-second: 1",
+        "",
+        "use-singularity: true",
+        'singularity-args: "--bind /data1/greenbab/,/data1/collab001/"',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_slurm_profile(root, model_path, model_rule=None, quantile=0.95,
+                        bytes_per_record=None):
+    """Write profiles/slurm/config.yaml sized from runtime-resource-study models.
+
+    Parameters
+    ----------
+    root : Path
+        Project root.
+    model_path : str
+        model.yaml (with ``model_rule``) or snakemake_bench_ingest.py output dir.
+    model_rule : str or None
+    quantile : float
+        Safety quantile from the model's prediction_intervals.
+    bytes_per_record : float or None
+        Converts input size to records for record-based models (default: the
+        model's validation runs).
+    """
+    rule_resources = {}
+    for rule, model, unit in _load_resource_models(model_path, model_rule):
+        sized = _rule_resources(model, unit, quantile, bytes_per_record)
+        if sized is None:
+            print(f"WARNING: {rule}: no bytes-per-record to map input size to records "
+                  "(pass --bytes-per-record); left on default-resources", file=sys.stderr)
+            continue
+        rule_resources[rule] = sized
+    profile = root / "profiles/slurm/config.yaml"
+    profile.parent.mkdir(parents=True, exist_ok=True)
+    profile.write_text(_profile_content(rule_resources, model_path, quantile))
+    print(f"SLURM profile: {profile} ({len(rule_resources)} rules sized from {model_path})")
+
+
 # ---------------------------------------------------------------------------
 # Main logic
 # ---------------------------------------------------------------------------
 
-def create_project(project_name, project_type, genome, engine=None, in_place=False):
+def create_project(project_name, project_type, genome, engine=None, in_place=False,
+                   resource_model=None, model_rule=None, quantile=0.95, bytes_per_record=None,
+                   databases_config=DATABASES_CONFIG):
     """Create the project directory structure and starter files.
 
     Parameters
@@ -309,6 +671,14 @@ def create_project(project_name, project_type, genome, engine=None, in_place=Fal
     in_place : bool
         If True, scaffold into the current working directory instead of
         creating a new subdirectory.
+    resource_model : str or None
+        model.yaml or per-rule model directory; when given, profiles/slurm
+        gets a config.yaml with per-rule set-resources (snakemake only).
+    model_rule, quantile, bytes_per_record
+        Passed to :func:`write_slurm_profile`.
+    databases_config : Path or None
+        databases_config.yaml to fill reference paths from; None skips the
+        lookup and leaves them as commented placeholders.
     """
     if in_place:
         root = Path.cwd()
@@ -339,16 +709,20 @@ def create_project(project_name, project_type, genome, engine=None, in_place=Fal
         (root / d).mkdir(parents=True, exist_ok=True)
 
     # Write starter files
+    references = resolve_references(genome, databases_config) if databases_config else None
     files = {
         ".gitignore": _gitignore_content(),
         "sample_sheet.tsv": _sample_sheet_content(),
-        "config.yaml": _config_content(project_name, genome, project_type),
+        "config.yaml": _config_content(project_name, genome, project_type, references),
         "README.md": _readme_content(project_name, genome, project_type),
     }
 
     for filename, content in files.items():
         (root / filename).write_text(content)
 
+    if resource_model:
+        write_slurm_profile(root, resource_model, model_rule, quantile, bytes_per_record)
+
     # Summary
     dir_count = sum(1 for _ in root.rglob("*") if _.is_dir())
     file_count = sum(1 for _ in root.rglob("*") if _.is_file())
@@ -357,6 +731,10 @@ def create_project(project_name, project_type, genome, engine=None, in_place=Fal
     if engine:
         print(f"  Engine: {engine}")
     print(f"  Genome: {genome}")
+    if references:
+        n_bad = sum(1 for v in references["resources"].values() if v["problem"])
+        print(f"  Refs:   {len(references['resources'])} paths for {references['build']}"
+              + (f" ({n_bad} with problems, see config.yaml)" if n_bad else ""))
     print(f"  Root:   {root.resolve()}")
 
 
@@ -381,6 +759,10 @@ Examples:
   # Build a Nextflow pipeline:
   %(prog)s --name ont_pipeline --type pipeline --engine nextflow --genome mm10
 
+  # Snakemake pipeline with a SLURM profile sized from fitted per-rule models:
+  %(prog)s --name variant_pipeline --type pipeline --engine snakemake --genome hg38 \
+      --resource-model smk_models/
+
   # ML project:
   %(prog)s --name classifier --type ml --genome hg38
 """,
@@ -411,13 +793,55 @@ Examples:
         choices=VALID_GENOMES,
         help="Primary genome build",
     )
-    parser.add_argument("--version", action="version", version="%(prog)s 0.2.0")
+    parser.add_argument(
+        "--databases-config",
+        default=str(DATABASES_CONFIG),
+        help="databases_config.yaml to resolve --genome reference paths from",
+    )
+    parser.add_argument(
+        "--no-references",
+        action="store_true",
+        help="Leave reference paths in config.yaml as commented placeholders",
+    )
+    parser.add_argument(
+        "--resource-model",
+        default=None,
+        help="model.yaml (fit_model.py) or per-rule model dir (snakemake_bench_ingest.py); "
+        "generates profiles/slurm/config.yaml with input-size-scaled set-resources",
+    )
+    parser.add_argument(
+        "--model-rule",
+        default=None,
+        help="Rule a single model.yaml applies to",
+    )
+    parser.add_argument(
+        "--quantile",
+        type=float,
+        default=0.95,
+        help="Safety quantile from the model's prediction_intervals (default: 0.95)",
+    )
+    parser.add_argument(
+        "--bytes-per-record",
+        type=float,
+        default=None,
+        help="Input bytes per record for record-based models (default: from model.yaml)",
+    )
+    parser.add_argument(
+        "--profile-only",
+        action="store_true",
+        help="Only (re)write profiles/slurm/config.yaml in an existing project",
+    )
+    parser.add_argument("--version", action="version", version="%(prog)s 0.3.0")
 
     args = parser.parse_args()
 
     # Validate: --engine is required for pipeline, ignored otherwise
     if args.type == "pipeline" and args.engine is None:
         parser.error("--engine is required when --type is 'pipeline'")
+    if args.resource_model and not (args.type == "pipeline" and args.engine == "snakemake"):
+        parser.error("--resource-model needs --type pipeline --engine snakemake")
+    if args.profile_only and not args.resource_model:
+        parser.error("--profile-only needs --resource-model")
 
     return args
 
@@ -426,4 +850,12 @@ if __name__ == "__main__":
     args = parse_args()
     in_place = args.name is None
     project_name = args.name if args.name else Path.cwd().name
-    create_project(project_name, args.type, args.genome, engine=args.engine, in_place=in_place)
+    if args.profile_only:
+        root = Path.cwd() if in_place else Path(project_name)
+        write_slurm_profile(root, args.resource_model, args.model_rule, args.quantile,
+                            args.bytes_per_record)
+        sys.exit(0)
+    create_project(project_name, args.type, args.genome, engine=args.engine, in_place=in_place,
+                   resource_model=args.resource_model, model_rule=args.model_rule,
+                   quantile=args.quantile, bytes_per_record=args.bytes_per_record,
+                   databases_config=None if args.no_references else args.databases_config)
@@ -171,6 +171,24 @@ def image_page(img_path: Path) -> int | None:
     return int(m.group(1)) if m else None
 
 
+def index_images_by_page(images: list[Path]) -> dict[int, list[Path]]:
+    """
+    Group images by source page once per deck: {page: [images, largest file
+    first]}. File sizes are stat'ed once here instead of on every lookup;
+    equal sizes keep filename order, matching max() over the sorted list.
+    Images without a page number in their filename are left out.
+    """
+    by_page: dict[int, list[tuple[int, Path]]] = {}
+    for p in images:
+        page = image_page(p)
+        if page is not None:
+            by_page.setdefault(page, []).append((p.stat().st_size, p))
+    return {
+        page: [p for _, p in sorted(entries, key=lambda e: -e[0])]
+        for page, entries in by_page.items()
+    }
+
+
 def slide_figure_ref(visual_text: str) -> int | None:
     """If the slide's Visual: field references a numbered figure, return the
     figure number; else None."""
@@ -181,7 +199,7 @@ def slide_figure_ref(visual_text: str) -> int | None:
 def resolve_image_for_figure(
     fig_num: int,
     caption_pages: dict[int, int],
-    images: list[Path],
+    page_index: dict[int, list[Path]],
     used: set[Path],
     figure_to_image: dict[int, Path],
 ) -> Path | None:
@@ -198,7 +216,8 @@ def resolve_image_for_figure(
          → caption_page (figure on the same page as caption)
          → caption_page + 1 (figure overflow to next page).
       3. Skip images already claimed by a different figure.
-      4. Pick the image with the largest file size on the chosen page.
+      4. Pick the image with the largest file size on the chosen page
+         (page_index from index_images_by_page lists them largest first).
 
     Returns None if no caption is known or no usable image found; caller
     falls back to sequential.
@@ -214,13 +233,11 @@ def resolve_image_for_figure(
 
     # Layout-typical page priority
     for offset in (-1, 0, 1):
-        page = cap_page + offset
-        candidates = [
-            p for p in images
-            if image_page(p) == page and p not in used
-        ]
-        if candidates:
-            best = max(candidates, key=lambda p: p.stat().st_size)
+        best = next(
+            (p for p in page_index.get(cap_page + offset, ()) if p not in used),
+            None,
+        )
+        if best is not None:
             used.add(best)
             figure_to_image[fig_num] = best
             return best
@@ -305,6 +322,7 @@ def build_pptx(
     caption_pages: dict[int, int] = {}
     if pdf_path is not None:
         caption_pages = parse_caption_pages(pdf_path)
+    page_index = index_images_by_page(image_files) if caption_pages else {}
 
     # Sequential pool: images we haven't yet placed via figure resolution
     seq_iter = iter(image_files)
@@ -398,7 +416,7 @@ def build_pptx(
                 fig_num = slide_figure_ref(s["visual"]) or slide_figure_ref(s["title"])
                 if fig_num is not None and caption_pages:
                     img_path = resolve_image_for_figure(
-                        fig_num, caption_pages, image_files,
+                        fig_num, caption_pages, page_index,
                         placed_via_caption, figure_to_image,
                     )
                     if img_path is not None:
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Shared columnar loader for benchmark tables (benchmark.csv, manifest.tsv,
+# pooled multi-stage CSVs, Parquet). Reads only the requested columns, parses them to
+# typed numpy arrays, and yields fixed-size chunks so callers can aggregate in a
+# streaming fashion instead of materialising one dict per row. Used by fit_model.py
+# and cost_accounting.py; import it from a sibling script (the scripts/ directory is
+# on sys.path when those are run directly).
+#
+# Formats: .csv / .tsv (optionally .gz) via pyarrow.csv when available, else the csv
+# module; .parquet / .pq via pyarrow (required for Parquet); .sqlite / .db — the
+# `benchmark` table written by bench_store.py compact.
+
+import csv
+import gzip
+import sqlite3
+
+import numpy as np
+
+CHUNK_ROWS = 250_000
+FLOAT, STR = "f", "s"
+SQLITE_TABLE = "benchmark"
+
+
+def _is_parquet(path):
+    return str(path).endswith((".parquet", ".pq"))
+
+
+def _is_sqlite(path):
+    return str(path).endswith((".sqlite", ".db"))
+
+
+def _delimiter(path):
+    name = str(path)[:-3] if str(path).endswith(".gz") else str(path)
+    return "\t" if name.endswith(".tsv") else ","
+
+
+def to_float(vals):
+    """Vectorised str -> float64; blanks / NA / junk become NaN."""
+    try:
+        return np.array(vals, dtype=np.float64)
+    except ValueError:
+        out = np.empty(len(vals), dtype=np.float64)
+        for i, v in enumerate(vals):
+            try:
+                out[i] = float(v)
+            except (TypeError, ValueError):
+                out[i] = np.nan
+        return out
+
+
+def _typed(vals, kind):
+    if kind == FLOAT:
+        return to_float(vals)
+    return np.array(["" if v is None else str(v) for v in vals], dtype=object)
+
+
+def _missing(kind, n):
+    return np.full(n, np.nan) if kind == FLOAT else np.full(n, "", dtype=object)
+
+
+def read_header(path):
+    """Column names without reading the body."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    if _is_sqlite(path):
+        with sqlite3.connect(path) as con:
+            return [r[1] for r in con.execute(f"PRAGMA table_info({SQLITE_TABLE})")]
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        return next(csv.reader(f, delimiter=_delimiter(path)), [])
+
+
+def _iter_parquet(path, columns, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit(f"ERROR: reading {path} needs pyarrow (pip install pyarrow)")
+    pf = pq.ParquetFile(path)
+    present = [c for c in columns if c in pf.schema_arrow.names]
+    for batch in pf.iter_batches(batch_size=chunk_rows, columns=present):
+        n = batch.num_rows
+        out = {}
+        for c, kind in columns.items():
+            if c in present:
+                out[c] = _typed(batch.column(c).to_pylist(), kind)
+            else:
+                out[c] = _missing(kind, n)
+        yield out
+
+
+def _iter_sqlite(path, columns, chunk_rows):
+    con = sqlite3.connect(path)
+    try:
+        have = {r[1] for r in con.execute(f"PRAGMA table_info({SQLITE_TABLE})")}
+        present = [c for c in columns if c in have]
+        select = ", ".join(f'"{c}"' for c in present) or "NULL"
+        cur = con.execute(f"SELECT {select} FROM {SQLITE_TABLE}")
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            cols = dict(zip(present, zip(*rows)))
+            yield {c: (_typed(list(cols[c]), kind) if c in cols else _missing(kind, len(rows)))
+                   for c, kind in columns.items()}
+    finally:
+        con.close()
+
+
+def _iter_arrow_csv(path, columns, chunk_rows, header):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    present = [c for c in columns if c in header]
+    # Read everything as strings and parse ourselves so NA / blanks behave the same
+    # as the csv-module path.
+    convert = pacsv.ConvertOptions(include_columns=present,
+                                   column_types={c: pa.string() for c in present})
+    parse = pacsv.ParseOptions(delimiter=_delimiter(path))
+    read = pacsv.ReadOptions(block_size=1 << 24)
+    with pacsv.open_csv(path, read_options=read, parse_options=parse,
+                        convert_options=convert) as reader:
+        for batch in reader:
+            for start in range(0, batch.num_rows, chunk_rows):
+                part = batch.slice(start, chunk_rows)
+                n = part.num_rows
+                out = {}
+                for c, kind in columns.items():
+                    if c in present:
+                        out[c] = _typed(part.column(c).to_pylist(), kind)
+                    else:
+                        out[c] = _missing(kind, n)
+                yield out
+
+
+def _iter_stdlib_csv(path, columns, chunk_rows):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", newline="") as f:
+        reader = csv.reader(f, delimiter=_delimiter(path))
+        header = next(reader, [])
+        pos = {c: header.index(c) for c in columns if c in header}
+        buf = {c: [] for c in pos}
+        n = 0
+
+        def flush():
+            out = {c: (_typed(buf[c], kind) if c in pos else _missing(kind, n))
+                   for c, kind in columns.items()}
+            for c in buf:
+                buf[c] = []
+            return out
+
+        for row in reader:
+            for c, i in pos.items():
+                buf[c].append(row[i] if i < len(row) else "")
+            n += 1
+            if n == chunk_rows:
+                yield flush()
+                n = 0
+        if n:
+            yield flush()
+
+
+def iter_columns(path, columns, chunk_rows=CHUNK_ROWS):
+    """Yield chunks of a benchmark table as {column: np.ndarray}.
+
+    columns maps name -> FLOAT ("f") or STR ("s"). Columns absent from the file come
+    back as all-NaN / all-"" so callers can keep their usual fallbacks (e.g.
+    primary_records -> n_records). Peak memory is one chunk of the requested columns."""
+    if _is_parquet(path):
+        yield from _iter_parquet(path, columns, chunk_rows)
+        return
+    if _is_sqlite(path):
+        yield from _iter_sqlite(path, columns, chunk_rows)
+        return
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        yield from _iter_stdlib_csv(path, columns, chunk_rows)
+        return
+    yield from _iter_arrow_csv(path, columns, chunk_rows, read_header(path))
+
+
+def read_columns(path, columns):
+    """Whole table (requested columns only) as {column: np.ndarray}."""
+    chunks = list(iter_columns(path, columns))
+    if not chunks:
+        return {c: _missing(kind, 0) for c, kind in columns.items()}
+    return {c: np.concatenate([ch[c] for ch in chunks]) for c in columns}
+
+
+def coalesce(*arrays, default=np.nan):
+    """Element-wise first finite value across float arrays (like SQL COALESCE)."""
+    out = np.full(len(arrays[0]), default, dtype=np.float64)
+    for a in reversed(arrays):
+        out = np.where(np.isfinite(a), a, out)
+    return out
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Concurrent-safe benchmark store. Each 03_run_one job writes its own
+# one-row record file into <run_dir>/records/ via write-to-temp + atomic rename, so
+# hundreds of simultaneous jobs never contend on a lock or interleave partial rows.
+# `compact` merges the record files into one SQLite table (`benchmark`, keyed by run_id,
+# latest timestamp wins) and refreshes a benchmark.csv snapshot for tools that still want a
+# flat file. Compaction is incremental and idempotent: merged records move into
+# records/.compacted/, and re-running only picks up new files.
+#
+# Usage:
+#   python bench_store.py compact <run_dir> [--import-csv <legacy benchmark.csv>]
+#                                           [--no-csv] [--parquet]
+#   python bench_store.py status  <run_dir>
+
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+TABLE = "benchmark"
+DB_NAME = "benchmark.sqlite"
+RECORDS_DIR = "records"
+COMPACTED_DIR = ".compacted"
+
+
+def _value(v):
+    """Store numbers as numbers so SQLite / R / numpy read typed columns."""
+    if v is None or v == "":
+        return None
+    try:
+        f = float(v)
+    except ValueError:
+        return v
+    return int(f) if f.is_integer() and "." not in v and "e" not in v.lower() else f
+
+
+def read_records(path):
+    """Rows from a record or legacy CSV. Skips repeated header lines and rows whose
+    field count doesn't match the header (half-written appends from the flock era)."""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return [], []
+        rows = []
+        for fields in reader:
+            if fields == header or len(fields) != len(header):
+                continue
+            rows.append(dict(zip(header, fields)))
+    return header, rows
+
+
+def connect(db_path):
+    con = sqlite3.connect(db_path, timeout=60)
+    con.execute("PRAGMA journal_mode=DELETE")   # WAL is unsafe on NFS / GPFS
+    return con
+
+
+def ensure_table(con, header):
+    """Create the table, or add any columns new record files introduce."""
+    have = [r[1] for r in con.execute(f"PRAGMA table_info({TABLE})")]
+    if not have:
+        cols = ", ".join(f'"{c}"' + (" PRIMARY KEY" if c == "run_id" else "") for c in header)
+        con.execute(f"CREATE TABLE {TABLE} ({cols})")
+        return list(header)
+    for c in header:
+        if c not in have:
+            con.execute(f'ALTER TABLE {TABLE} ADD COLUMN "{c}"')
+            have.append(c)
+    return have
+
+
+def upsert(con, header, rows):
+    """Upsert keyed by run_id: a resubmitted run overwrites its old row, but only if
+    its timestamp is not older than the stored one. The check runs inside SQLite, so
+    the latest run wins whatever order record files (or compactions) apply them in."""
+    if not rows:
+        return 0
+    have = ensure_table(con, header)
+    cols = ", ".join(f'"{c}"' for c in header)
+    marks = ", ".join("?" for _ in header)
+    # Columns this header lacks are cleared, as INSERT OR REPLACE would
+    sets = ", ".join(f'"{c}" = ' + (f'excluded."{c}"' if c in header else "NULL")
+                     for c in have if c != "run_id")
+    newer = ""
+    if "timestamp" in header:
+        newer = (f" WHERE excluded.timestamp IS NULL OR {TABLE}.timestamp IS NULL"
+                 f" OR excluded.timestamp >= {TABLE}.timestamp")
+    con.executemany(f"INSERT INTO {TABLE} ({cols}) VALUES ({marks}) "
+                    f"ON CONFLICT(run_id) DO UPDATE SET {sets}{newer}",
+                    [[_value(r.get(c)) for c in header] for r in rows])
+    return len(rows)
+
+
+def export_csv(con, out_path):
+    """Atomic benchmark.csv snapshot of the table (temp file + rename)."""
+    cur = con.execute(f"SELECT * FROM {TABLE} ORDER BY run_id")
+    header = [d[0] for d in cur.description]
+    tmp = Path(f"{out_path}.tmp.{os.getpid()}")
+    with open(tmp, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        for row in cur:
+            w.writerow(["" if v is None else v for v in row])
+    os.replace(tmp, out_path)
+    return header
+
+
+def export_parquet(con, out_path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("WARNING: pyarrow not installed; skipping Parquet export", file=sys.stderr)
+        return
+    cur = con.execute(f"SELECT * FROM {TABLE} ORDER BY run_id")
+    header = [d[0] for d in cur.description]
+    cols = list(zip(*cur.fetchall())) or [[] for _ in header]
+    table = pa.table({h: pa.array([None if v is None else str(v) for v in col])
+                      for h, col in zip(header, cols)})
+    tmp = f"{out_path}.tmp.{os.getpid()}"
+    pq.write_table(table, tmp)
+    os.replace(tmp, out_path)
+
+
+def compact(run_dir, import_csv=None, write_csv=True, write_parquet=False):
+    run_dir = Path(run_dir)
+    rec_dir = run_dir / RECORDS_DIR
+    done_dir = rec_dir / COMPACTED_DIR
+    done_dir.mkdir(parents=True, exist_ok=True)
+    # Finished records only: writers rename .<name>.tmp -> <name>.csv when complete
+    records = sorted(p for p in rec_dir.glob("*.csv") if not p.name.startswith("."))
+
+    con = connect(run_dir / DB_NAME)
+    n_rows, n_bad = 0, 0
+    with con:    # one transaction — either every record lands or none do
+        con.execute("BEGIN IMMEDIATE")
+        if import_csv:
+            header, rows = read_records(import_csv)
+            n_rows += upsert(con, header, rows)
+            print(f"[import] {len(rows)} rows from {import_csv}")
+        for p in records:
+            header, rows = read_records(p)
+            if not rows:
+                n_bad += 1
+                continue
+            n_rows += upsert(con, header, rows)
+    # Archive only after the transaction committed
+    for p in records:
+        if p.exists():
+            os.replace(p, done_dir / p.name)
+
+    total = con.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] if _has_table(con) else 0
+    print(f"[compact] {len(records)} record files ({n_bad} empty/corrupt), "
+          f"{n_rows} rows upserted; table now {total} run_ids -> {run_dir / DB_NAME}")
+    if total and write_csv:
+        export_csv(con, run_dir / "benchmark.csv")
+        print(f"[export] {run_dir / 'benchmark.csv'}")
+    if total and write_parquet:
+        export_parquet(con, run_dir / "benchmark.parquet")
+        print(f"[export] {run_dir / 'benchmark.parquet'}")
+    con.close()
+
+
+def _has_table(con):
+    return bool(con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+                            (TABLE,)).fetchone())
+
+
+def status(run_dir):
+    run_dir = Path(run_dir)
+    pending = [p for p in (run_dir / RECORDS_DIR).glob("*.csv") if not p.name.startswith(".")]
+    db = run_dir / DB_NAME
+    n = 0
+    if db.exists():
+        con = connect(db)
+        n = con.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0] if _has_table(con) else 0
+        con.close()
+    print(f"{run_dir}: {n} run_ids compacted, {len(pending)} record files pending")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("compact", help="Merge records/*.csv into benchmark.sqlite")
+    c.add_argument("run_dir")
+    c.add_argument("--import-csv", default=None,
+                   help="Also ingest a legacy flock-appended benchmark.csv")
+    c.add_argument("--no-csv", action="store_true", help="Skip the benchmark.csv snapshot")
+    c.add_argument("--parquet", action="store_true", help="Also write benchmark.parquet")
+    s = sub.add_parser("status", help="Count compacted vs pending records")
+    s.add_argument("run_dir")
+    args = p.parse_args()
+
+    if args.cmd == "compact":
+        compact(args.run_dir, args.import_csv, not args.no_csv, args.parquet)
+    else:
+        status(args.run_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Version-to-version regression check. Takes a baseline and a candidate benchmark
+# (e.g. samtools 1.20 vs 1.21 on the standard inputs), matches runs by condition, and per
+# condition × metric runs a one-sided rank test (candidate larger = worse) with a
+# Hodges–Lehmann ratio and Cliff's delta as effect sizes. p-values are corrected across
+# every test (Benjamini–Hochberg by default, or Holm). A condition regressed when it is
+# significant after correction AND slower / bigger by at least the practical threshold.
+# Exit status 1 (FAIL) if anything regressed, so it can gate a version bump in CI.
+#
+# The test is an exact permutation test on the pooled ranks when the number of
+# relabellings is small (typical 3–10 replicates), else a seeded Monte Carlo one — no
+# normal approximation at the replicate counts this skill uses, and ties are exact.
+#
+# Usage:
+#   python compare_versions.py --baseline stage4_v1.20/benchmark.csv --candidate stage4_v1.21/benchmark.csv
+#       [--output regressions.tsv] [--metrics wall_s,peak_rss_kb]
+#       [--match-cols input,threads,mem_per_thread,compression_level,tmp_dir]
+#       [--alpha 0.05] [--correction bh|holm] [--min-effect wall_s=0.05,peak_rss_kb=0.10]
+
+import argparse
+import csv
+import sys
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from bench_io import FLOAT, STR, read_columns, read_header
+
+DEFAULT_METRICS = ["wall_s", "peak_rss_kb"]
+# Factor columns that define "the same condition" across versions. Only those present in
+# both tables are used; tool_version / build_mode are what differs, so never match on them.
+DEFAULT_MATCH = ["input", "threads", "mem_per_thread", "compression_level", "tmp_dir",
+                 "batch_size", "num_runners", "model", "cache_state"]
+DEFAULT_MIN_EFFECT = {"wall_s": 0.05, "peak_rss_kb": 0.10}
+MIN_REPLICATES = 2
+EXACT_MAX = 20_000          # enumerate all relabellings up to this many
+N_PERMUTATIONS = 20_000     # Monte Carlo draws beyond that
+
+
+def _ranks(x):
+    """Average ranks (ties share the mean rank), 1-based."""
+    order = np.argsort(x, kind="mergesort")
+    xs = x[order]
+    ranks = np.empty(len(x))
+    i = 0
+    while i < len(xs):
+        j = i
+        while j + 1 < len(xs) and xs[j + 1] == xs[i]:
+            j += 1
+        ranks[order[i:j + 1]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def rank_test(base, cand, seed=42):
+    """One-sided p-value for "candidate tends to be larger" (Mann–Whitney U on pooled
+    ranks, exact or Monte Carlo permutation), plus U and the smallest p attainable."""
+    n1, n2 = len(base), len(cand)
+    r = _ranks(np.concatenate([base, cand]))
+    observed = r[n1:].sum()
+    u = observed - n2 * (n2 + 1) / 2
+    n_perm = comb(n1 + n2, n2)
+    if n_perm <= EXACT_MAX:
+        idx = np.array(list(combinations(range(n1 + n2), n2)))
+        sums = r[idx].sum(axis=1)
+        p = np.mean(sums >= observed - 1e-9)
+        p_min = 1 / n_perm
+    else:
+        rng = np.random.default_rng(seed)
+        perm = rng.permuted(np.tile(r, (N_PERMUTATIONS, 1)), axis=1)
+        sums = perm[:, n1:].sum(axis=1)
+        p = (np.sum(sums >= observed - 1e-9) + 1) / (N_PERMUTATIONS + 1)
+        p_min = 1 / (N_PERMUTATIONS + 1)
+    return float(p), float(u), float(p_min)
+
+
+def effect_sizes(base, cand):
+    """Hodges–Lehmann ratio (median of all pairwise cand/base ratios) and Cliff's delta
+    (P(cand > base) - P(cand < base))."""
+    diff = np.subtract.outer(cand, base)
+    delta = (np.sum(diff > 0) - np.sum(diff < 0)) / diff.size
+    ok = (base > 0).all() and (cand > 0).all()
+    ratio = float(np.exp(np.median(np.subtract.outer(np.log(cand), np.log(base))))) if ok else np.nan
+    return ratio, float(delta)
+
+
+def adjust(p, method):
+    """Multiple-testing correction over a vector of p-values; NaNs pass through."""
+    p = np.asarray(p, dtype=float)
+    out = np.full(len(p), np.nan)
+    ok = np.flatnonzero(np.isfinite(p))
+    m = len(ok)
+    if not m:
+        return out
+    order = ok[np.argsort(p[ok])]
+    ps = p[order]
+    if method == "holm":
+        adj = np.maximum.accumulate(ps * (m - np.arange(m)))
+    else:    # Benjamini–Hochberg step-up
+        adj = np.minimum.accumulate((ps * m / np.arange(1, m + 1))[::-1])[::-1]
+    out[order] = np.minimum(adj, 1.0)
+    return out
+
+
+def load(path, metrics, match_cols):
+    columns = {c: STR for c in match_cols}
+    columns.update({m: FLOAT for m in metrics})
+    columns["exit_status"] = FLOAT
+    columns["tool_version"] = STR
+    t = read_columns(path, columns)
+    status = t["exit_status"]
+    ok = ~np.isfinite(status) | (status == 0)
+    keys = np.array(["\x1f".join(v) for v in zip(*(t[c] for c in match_cols))]) \
+        if match_cols else np.full(len(ok), "", dtype=object)
+    versions = sorted(set(t["tool_version"][ok]) - {""})
+    return {"key": keys[ok], **{m: t[m][ok] for m in metrics}}, versions
+
+
+def compare(base, cand, metrics, min_effect, seed=42):
+    rows = []
+    keys = sorted(set(base["key"]) & set(cand["key"]))
+    for key in keys:
+        bm, cm = base["key"] == key, cand["key"] == key
+        for metric in metrics:
+            b = base[metric][bm]
+            c = cand[metric][cm]
+            b, c = b[np.isfinite(b)], c[np.isfinite(c)]
+            row = {"condition": key, "metric": metric, "n_base": len(b), "n_cand": len(c),
+                   "median_base": float(np.median(b)) if len(b) else np.nan,
+                   "median_cand": float(np.median(c)) if len(c) else np.nan,
+                   "hl_ratio": np.nan, "cliffs_delta": np.nan, "u": np.nan,
+                   "p": np.nan, "p_faster": np.nan, "p_min": np.nan,
+                   "min_effect": min_effect.get(metric, 0.0)}
+            if len(b) >= MIN_REPLICATES and len(c) >= MIN_REPLICATES:
+                row["hl_ratio"], row["cliffs_delta"] = effect_sizes(b, c)
+                row["p"], row["u"], row["p_min"] = rank_test(b, c, seed)
+                row["p_faster"] = rank_test(c, b, seed)[0]
+            rows.append(row)
+    return rows, keys
+
+
+def classify(rows, alpha):
+    n_tests = sum(np.isfinite(r["p"]) for r in rows)
+    for r in rows:
+        if not np.isfinite(r["p"]):
+            r["verdict"] = "insufficient"
+        elif r["q"] <= alpha and r["hl_ratio"] >= 1 + r["min_effect"]:
+            r["verdict"] = "regressed"
+        elif r["q_faster"] <= alpha and r["hl_ratio"] <= 1 / (1 + r["min_effect"]):
+            r["verdict"] = "improved"
+        elif r["p_min"] * n_tests > alpha:
+            # Even complete separation could fail to survive correction at this n; say so
+            # rather than "ok" (e.g. 5 vs 5 replicates: p >= 1/252, so > 12 tests is too many)
+            r["verdict"] = "underpowered"
+        else:
+            r["verdict"] = "ok"
+
+
+def _parse_min_effect(text):
+    out = dict(DEFAULT_MIN_EFFECT)
+    for part in (text or "").split(","):
+        if part.strip():
+            k, v = part.split("=")
+            out[k.strip()] = float(v)
+    return out
+
+
+def _fmt(v, spec):
+    return "NA" if isinstance(v, float) and not np.isfinite(v) else format(v, spec)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--baseline", required=True, help="Benchmark of the reference version")
+    p.add_argument("--candidate", required=True, help="Benchmark of the version under test")
+    p.add_argument("--output", default="regressions.tsv")
+    p.add_argument("--metrics", default=",".join(DEFAULT_METRICS))
+    p.add_argument("--match-cols", default=None,
+                   help="Comma-separated columns defining a condition "
+                        f"(default: those of {','.join(DEFAULT_MATCH)} present in both)")
+    p.add_argument("--alpha", type=float, default=0.05)
+    p.add_argument("--correction", choices=["bh", "holm"], default="bh",
+                   help="bh controls the false discovery rate; holm the family-wise error")
+    p.add_argument("--min-effect", default=None,
+                   help="Smallest regression that matters, as metric=fraction "
+                        "(default wall_s=0.05,peak_rss_kb=0.10; others 0)")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+
+    metrics = args.metrics.split(",")
+    if args.match_cols:
+        match_cols = args.match_cols.split(",")
+    else:
+        both = set(read_header(args.baseline)) & set(read_header(args.candidate))
+        match_cols = [c for c in DEFAULT_MATCH if c in both]
+    min_effect = _parse_min_effect(args.min_effect)
+
+    base, v_base = load(args.baseline, metrics, match_cols)
+    cand, v_cand = load(args.candidate, metrics, match_cols)
+    print(f"[load] baseline {len(base['key'])} runs ({','.join(v_base) or 'version ?'}), "
+          f"candidate {len(cand['key'])} runs ({','.join(v_cand) or 'version ?'})")
+    print(f"[match] on {','.join(match_cols) or '(nothing — one pooled condition)'}")
+
+    rows, keys = compare(base, cand, metrics, min_effect, args.seed)
+    if not keys:
+        print("ERROR: no condition appears in both tables — check --match-cols", file=sys.stderr)
+        sys.exit(2)
+    n_only = len(set(base["key"]) ^ set(cand["key"]))
+    if n_only:
+        print(f"[match] {len(keys)} shared conditions; {n_only} present in only one table (skipped)")
+
+    # Each direction is its own family: regressions gate the verdict, improvements are
+    # reported so a faster release isn't mistaken for noise.
+    q = adjust([r["p"] for r in rows], args.correction)
+    q_faster = adjust([r["p_faster"] for r in rows], args.correction)
+    for r, qv, qf in zip(rows, q, q_faster):
+        r["q"], r["q_faster"] = qv, qf
+    classify(rows, args.alpha)
+
+    # Regressions first, worst ratio first; then everything else by ratio
+    rank = {"regressed": 0, "underpowered": 1, "ok": 2, "improved": 3, "insufficient": 4}
+    rows.sort(key=lambda r: (rank[r["verdict"]],
+                             -r["hl_ratio"] if np.isfinite(r["hl_ratio"]) else 0))
+    cols = ["condition", "metric", "verdict", "n_base", "n_cand", "median_base", "median_cand",
+            "hl_ratio", "cliffs_delta", "u", "p", "q", "q_faster"]
+    with open(args.output, "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(cols)
+        for r in rows:
+            w.writerow([r["condition"].replace("\x1f", "|"), r["metric"], r["verdict"],
+                        r["n_base"], r["n_cand"], _fmt(r["median_base"], ".4g"),
+                        _fmt(r["median_cand"], ".4g"), _fmt(r["hl_ratio"], ".4f"),
+                        _fmt(r["cliffs_delta"], ".3f"), _fmt(r["u"], ".1f"),
+                        _fmt(r["p"], ".4g"), _fmt(r["q"], ".4g"), _fmt(r["q_faster"], ".4g")])
+
+    counts = {v: sum(r["verdict"] == v for r in rows) for v in rank}
+    print(f"[compare] {len(rows)} tests ({len(keys)} conditions × {len(metrics)} metrics), "
+          f"{args.correction} at alpha={args.alpha} -> {args.output}")
+    print("  " + "  ".join(f"{v}={n}" for v, n in counts.items() if n))
+    for r in [r for r in rows if r["verdict"] == "regressed"][:10]:
+        print(f"  REGRESSED {r['metric']:<12} ×{r['hl_ratio']:.3f}  q={r['q']:.3g}  "
+              f"delta={r['cliffs_delta']:+.2f}  {r['condition'].replace(chr(31), '|')}")
+    if counts["underpowered"]:
+        print(f"  NOTE: {counts['underpowered']} tests may not reach alpha after correction with "
+              f"these replicate counts; add replicates or test fewer metrics / conditions")
+    if counts["regressed"]:
+        print("VERDICT: FAIL")
+        sys.exit(1)
+    print("VERDICT: PASS" + (f" ({counts['underpowered']} underpowered tests)"
+                             if counts["underpowered"] else ""))
+
+
+if __name__ == "__main__":
+    main()
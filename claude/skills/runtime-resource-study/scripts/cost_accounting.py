@@ -2,129 +2,347 @@
 # Author: claude (skill bundled)
 # Date: 2026-04-29
 # Purpose: Convert wall_s × threads × $/core-hour into per-condition CPU-hours and
-# dollar cost. Identify the cost-Pareto frontier (configs that aren't dominated by
-# any cheaper-AND-faster alternative). Default rate: $0.05/core-hour.
+# dollar cost. Identify the Pareto frontier over wall, cost and peak RSS (configs not
+# dominated on every objective by some alternative), plus optional extra objectives,
+# and tag every condition with its dominance rank (1 = frontier). Default rate:
+# $0.05/core-hour. With --pricing, costs follow a per-partition chargeback model
+# (core-hours + GB-hours of memory + GPU-hours, see assets/pricing_model.yaml), and
+# --sweep-gb-ratios shows at which GB-hour : core-hour price ratio the recommended
+# (cheapest admissible) config changes.
+#
+# Input is streamed column-wise in chunks via bench_io.py (.csv, .tsv, .gz or .parquet).
 #
 # Usage:
-#   python cost_accounting.py --csv <benchmark.csv> [--rate 0.05] --output cost_pareto.csv
+#   python cost_accounting.py --csv <benchmark.csv|.parquet> [--rate 0.05] --output cost_pareto.csv
+#       [--extra-objectives fs_out,major_pf]
+#       [--pricing pricing_model.yaml] [--mem-gb 80] [--sweep-gb-ratios 0,0.05,0.1,0.2,0.5]
 
 import argparse
 import csv
+import sys
+from bisect import bisect_right
+from collections import Counter
 from pathlib import Path
-from statistics import median
+
+import numpy as np
+
+from bench_io import FLOAT, STR, iter_columns, to_float
 
 
-def read_csv_dict(path):
-    rows = []
-    with open(path) as f:
-        for r in csv.DictReader(f):
-            rows.append(r)
-    return rows
+def _median(arrays):
+    v = np.concatenate(arrays) if arrays else np.empty(0)
+    v = v[np.isfinite(v)]
+    return float(np.median(v)) if v.size else None
 
 
-def aggregate_by_condition(rows, factor_keys):
-    """Group rows by (factor_keys) tuple; aggregate to median wall, min/max, threads."""
+def aggregate_by_condition(path, factor_keys, extra_keys=()):
+    """Stream a benchmark table in column chunks (bench_io) and group by (factor_keys);
+    aggregate to median wall, min/max, threads, median peak RSS and the median of any
+    extra objective columns. Exact medians need every value, so memory still grows with
+    the row count: each group keeps one float64 per row per aggregated column (numpy
+    arrays, no row dicts) — about 8 bytes × columns × rows, e.g. ~200 MB for 5 M rows."""
+    numeric = ["wall_s", "threads", "peak_rss_kb", "gpu_count", "mem_requested_gb"] + list(extra_keys)
+    columns = {k: FLOAT for k in numeric}
+    columns.update({k: STR for k in factor_keys})     # factor levels stay strings
+    columns["partition"] = STR
+
+    kept = [c for c in numeric if c != "threads"]     # threads is part of the key
     groups = {}
-    for r in rows:
-        try:
-            wall = float(r["wall_s"])
-            threads = int(r["threads"])
-        except (KeyError, ValueError):
+    n_rows = 0
+    for chunk in iter_columns(path, columns):
+        num = {c: chunk[c] if columns[c] == FLOAT else to_float(chunk[c]) for c in numeric}
+        ok = np.isfinite(num["wall_s"]) & np.isfinite(num["threads"])
+        n_rows += len(ok)
+        if not ok.any():
             continue
-        key = tuple(r.get(k, "") for k in factor_keys)
-        groups.setdefault(key, []).append((wall, threads))
+        labels = np.array(["\x1f".join(t) for t in zip(*(chunk[k][ok] for k in factor_keys))])
+        uniq, inv = np.unique(labels, return_inverse=True)
+        order = np.argsort(inv, kind="stable")
+        bounds = np.cumsum(np.bincount(inv))[:-1]
+        for g, idx in zip(uniq, np.split(order, bounds)):
+            acc = groups.get(g)
+            if acc is None:
+                acc = groups[g] = {"key": tuple(chunk[k][ok][idx[0]] for k in factor_keys),
+                                   "threads": int(num["threads"][ok][idx[0]]),
+                                   "partition": Counter(), **{c: [] for c in kept}}
+            for c in kept:
+                acc[c].append(num[c][ok][idx])
+            acc["partition"].update(chunk["partition"][ok][idx].tolist())
+
     out = []
-    for key, vals in groups.items():
-        walls = [w for w, _ in vals]
-        threads = vals[0][1]    # threads is part of the key; same for the group
-        out.append({
-            **dict(zip(factor_keys, key)),
-            "n": len(vals),
-            "wall_med": median(walls),
-            "wall_min": min(walls),
-            "wall_max": max(walls),
-            "threads": threads,
-        })
-    return out
-
-
-def add_cost(conditions, rate_per_core_hour):
-    for c in conditions:
-        cpu_hours = c["wall_med"] / 3600 * c["threads"]
-        c["cpu_hours_med"] = cpu_hours
-        c["cost_med_usd"] = cpu_hours * rate_per_core_hour
-        # Range from min/max wall
-        c["cost_lo_usd"] = c["wall_min"] / 3600 * c["threads"] * rate_per_core_hour
-        c["cost_hi_usd"] = c["wall_max"] / 3600 * c["threads"] * rate_per_core_hour
+    for acc in groups.values():
+        walls = np.concatenate(acc["wall_s"])
+        rss_kb = _median(acc["peak_rss_kb"])
+        gpus = _median(acc["gpu_count"])
+        c = {
+            **dict(zip(factor_keys, acc["key"])),
+            "n": int(walls.size),
+            "wall_med": float(np.median(walls)),
+            "wall_min": float(walls.min()),
+            "wall_max": float(walls.max()),
+            "threads": acc["threads"],    # threads is part of the key; same for the group
+            "peak_rss_gb_med": rss_kb / 1024 ** 2 if rss_kb is not None else float("inf"),
+        }
+        for k in extra_keys:
+            m = _median(acc[k])
+            c[k] = m if m is not None else float("inf")
+        c["partition"] = acc["partition"].most_common(1)[0][0] or "NA"
+        c["gpus"] = gpus if gpus is not None else 0.0
+        c["mem_requested_gb"] = _median(acc["mem_requested_gb"])
+        out.append(c)
+    return out, n_rows
+
+
+def load_pricing(path, flat_rate):
+    """Pricing model dict. Without a file, a single flat core-hour rate with free memory
+    and GPUs reproduces the original wall × threads × rate accounting."""
+    if path is None:
+        return {"default_partition": "default",
+                "partitions": {"default": {"core_hour_usd": flat_rate,
+                                           "gb_hour_usd": 0.0, "gpu_hour_usd": 0.0}}}
+    try:
+        import yaml
+    except ImportError:
+        raise SystemExit("ERROR: --pricing needs PyYAML (pip install pyyaml)")
+    pricing = yaml.safe_load(Path(path).read_text()) or {}
+    parts = pricing.get("partitions") or {}
+    default = pricing.get("default_partition")
+    if not parts:
+        raise SystemExit(f"ERROR: {path} defines no partitions")
+    if default not in parts:
+        raise SystemExit(f"ERROR: {path}: default_partition '{default}' is not one of "
+                         f"its partitions ({', '.join(map(str, parts))})")
+    missing = [name for name, r in parts.items() if "core_hour_usd" not in (r or {})]
+    if missing:
+        raise SystemExit(f"ERROR: {path}: no core_hour_usd for partition(s) {', '.join(missing)}")
+    return pricing
+
+
+def unknown_partitions(conditions, pricing):
+    """Partitions recorded in the benchmark but absent from the pricing model (NA
+    excluded); these conditions are billed at default_partition rates."""
+    return sorted({c["partition"] for c in conditions} - set(pricing["partitions"]) - {"NA"})
+
+
+def billing_arrays(conditions, pricing, mem_gb=None):
+    """Per-condition numpy arrays (one entry per condition) of everything the cost
+    formula needs: walls, billed threads / memory / GPUs and the partition's rates.
+    Memory billed = mem_requested_gb column, else --mem-gb, else median peak RSS."""
+    parts = pricing["partitions"]
+    default = pricing.get("default_partition")
+
+    def rates(c):
+        return parts.get(c["partition"], parts[default])
+
+    def billed_mem(c):
+        if c["mem_requested_gb"] is not None:
+            return c["mem_requested_gb"]
+        if mem_gb is not None:
+            return mem_gb
+        return c["peak_rss_gb_med"] if np.isfinite(c["peak_rss_gb_med"]) else 0.0
+
+    return {
+        "wall_med": np.array([c["wall_med"] for c in conditions], dtype=float),
+        "wall_min": np.array([c["wall_min"] for c in conditions], dtype=float),
+        "wall_max": np.array([c["wall_max"] for c in conditions], dtype=float),
+        "threads":  np.array([c["threads"] for c in conditions], dtype=float),
+        "mem_gb":   np.array([billed_mem(c) for c in conditions], dtype=float),
+        "gpus":     np.array([c["gpus"] for c in conditions], dtype=float),
+        "core_rate": np.array([rates(c)["core_hour_usd"] for c in conditions], dtype=float),
+        "gb_rate":   np.array([rates(c).get("gb_hour_usd", 0.0) for c in conditions], dtype=float),
+        "gpu_rate":  np.array([rates(c).get("gpu_hour_usd", 0.0) for c in conditions], dtype=float),
+    }
+
+
+def add_cost(conditions, pricing, mem_gb=None):
+    """Vectorised: cost = wall_h × (threads × core + mem_GB × GB-hour + gpus × GPU-hour),
+    computed for every condition at once, then written back onto the dicts."""
+    b = billing_arrays(conditions, pricing, mem_gb)
+    rate_per_hour = b["threads"] * b["core_rate"] + b["mem_gb"] * b["gb_rate"] + b["gpus"] * b["gpu_rate"]
+    cpu_hours = b["wall_med"] / 3600 * b["threads"]
+    cost_med = b["wall_med"] / 3600 * rate_per_hour
+    cost_lo = b["wall_min"] / 3600 * rate_per_hour     # range from min/max wall
+    cost_hi = b["wall_max"] / 3600 * rate_per_hour
+    gb_hours = b["wall_med"] / 3600 * b["mem_gb"]
+    for i, c in enumerate(conditions):
+        c["cpu_hours_med"] = float(cpu_hours[i])
+        c["gb_hours_med"] = float(gb_hours[i])
+        c["cost_med_usd"] = float(cost_med[i])
+        c["cost_lo_usd"] = float(cost_lo[i])
+        c["cost_hi_usd"] = float(cost_hi[i])
     return conditions
 
 
-def pareto_frontier(conditions):
-    """A condition is on the cost-Pareto frontier if no other is both cheaper and faster.
-    Returns the subset on the frontier, in order of increasing wall."""
-    sorted_c = sorted(conditions, key=lambda c: c["wall_med"])
-    frontier = []
-    min_cost = float("inf")
-    # Walk slowest-first; keep points where cost is strictly less than the running min
-    for c in sorted_c[::-1]:
-        if c["cost_med_usd"] < min_cost:
-            frontier.append(c)
-            min_cost = c["cost_med_usd"]
-    return frontier[::-1]   # back to fastest-first
+def sweep_gb_ratios(conditions, pricing, ratios, mem_gb=None, max_wall=None):
+    """Reprice every condition at each GB-hour : core-hour ratio (one broadcast over a
+    ratios × conditions matrix) and return the cheapest admissible condition per ratio.
+    The cheapest point is always on the frontier, so a change of pick marks a ratio at
+    which the recommended Pareto point moves."""
+    b = billing_arrays(conditions, pricing, mem_gb)
+    r = np.asarray(ratios, dtype=float)[:, None]
+    per_hour = (b["threads"] * b["core_rate"] + b["mem_gb"] * b["core_rate"] * r
+                + b["gpus"] * b["gpu_rate"])
+    cost = b["wall_med"] / 3600 * per_hour
+    if max_wall is not None:
+        cost = np.where(b["wall_med"] <= max_wall, cost, np.inf)
+    pick = np.argmin(cost, axis=1)
+    return [(float(ratios[k]), int(pick[k]), float(cost[k, pick[k]])) for k in range(len(ratios))]
+
+
+def skyline(points):
+    """Indices of the non-dominated points (all objectives minimised).
+
+    p dominates q if p <= q on every objective and p < q on at least one; identical
+    points don't dominate each other. For 2-3 objectives this is the O(n log n) sweep:
+    sort lexicographically, then keep a staircase of accepted (o2, o3) pairs with o2
+    ascending and o3 strictly descending — q is dominated iff the staircase entry with
+    the largest o2 <= q.o2 also has o3 <= q.o3. For > 3 objectives it falls back to
+    sort-filter-skyline (presort by sum, compare against the current front)."""
+    if not points:
+        return []
+    d = len(points[0])
+    uniq = {}
+    for i, p in enumerate(points):
+        uniq.setdefault(tuple(p), []).append(i)
+    keys = sorted(uniq)
+    front = []
+    if d <= 3:
+        stair_o2, stair_o3 = [], []
+        for k in keys:
+            o2 = k[1] if d > 1 else 0.0
+            o3 = k[2] if d > 2 else 0.0
+            j = bisect_right(stair_o2, o2)
+            if j > 0 and stair_o3[j - 1] <= o3:
+                continue    # dominated by an earlier (lexicographically smaller) point
+            front.append(k)
+            # Drop staircase entries the new point dominates in (o2, o3)
+            end = j
+            while end < len(stair_o2) and stair_o3[end] >= o3:
+                end += 1
+            stair_o2[j:end] = [o2]
+            stair_o3[j:end] = [o3]
+    else:
+        for k in sorted(keys, key=sum):
+            if not any(all(a <= b for a, b in zip(f, k)) for f in front):
+                front.append(k)
+    return sorted(i for k in front for i in uniq[k])
+
+
+def dominance_ranks(conditions, objectives):
+    """Non-dominated sorting: rank 1 is the Pareto frontier, rank 2 is the frontier once
+    rank 1 is removed, and so on. Sets c["pareto_rank"] in place and returns the
+    rank-1 conditions in order of increasing wall."""
+    remaining = list(range(len(conditions)))
+    rank = 0
+    while remaining:
+        rank += 1
+        pts = [tuple(conditions[i][o] for o in objectives) for i in remaining]
+        on_front = skyline(pts)
+        for j in on_front:
+            conditions[remaining[j]]["pareto_rank"] = rank
+        keep = set(on_front)
+        remaining = [i for j, i in enumerate(remaining) if j not in keep]
+    return sorted((c for c in conditions if c["pareto_rank"] == 1), key=lambda c: c["wall_med"])
 
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--csv", required=True)
+    p.add_argument("--csv", required=True, help="benchmark.csv (.csv/.tsv/.gz) or .parquet")
     p.add_argument("--rate", type=float, default=0.05,
                    help="Cost per core-hour in USD (default: 0.05)")
     p.add_argument("--factor-keys", default="threads,mem_per_thread,compression_level",
                    help="Comma-separated columns that define a 'condition' (default: threads,mem_per_thread,compression_level)")
+    p.add_argument("--extra-objectives", default="",
+                   help="Comma-separated benchmark.csv columns to also minimise (median per condition)")
+    p.add_argument("--no-rss", action="store_true",
+                   help="Drop peak RSS from the objectives (wall + cost only)")
+    p.add_argument("--pricing", default=None,
+                   help="Pricing-model YAML with per-partition core/GB/GPU-hour rates (see assets/pricing_model.yaml)")
+    p.add_argument("--mem-gb", type=float, default=None,
+                   help="Requested memory (GB) to bill when benchmark.csv has no mem_requested_gb column")
+    p.add_argument("--sweep-gb-ratios", default=None,
+                   help="Comma-separated GB-hour:core-hour price ratios to sweep, e.g. 0,0.02,0.05,0.1,0.2")
+    p.add_argument("--max-wall", type=float, default=None,
+                   help="Wall-time ceiling (s) for the recommended config in the rate sweep")
+    p.add_argument("--sweep-output", default=None, help="Optional CSV for the rate sweep")
     p.add_argument("--output", default="cost_pareto.csv")
     args = p.parse_args()
 
-    rows = read_csv_dict(args.csv)
     factor_keys = args.factor_keys.split(",")
-    print(f"Loaded {len(rows)} rows from {args.csv}")
-    print(f"Cost rate: ${args.rate}/core-hour")
-    print(f"Grouping by: {factor_keys}\n")
+    extra_keys = [k for k in args.extra_objectives.split(",") if k]
+    objectives = ["wall_med", "cost_med_usd"] + ([] if args.no_rss else ["peak_rss_gb_med"]) + extra_keys
+    pricing = load_pricing(args.pricing, args.rate)
+    if args.pricing:
+        print(f"Pricing model: {args.pricing} (default partition: {pricing.get('default_partition')})")
+    else:
+        print(f"Cost rate: ${args.rate}/core-hour")
+    print(f"Grouping by: {factor_keys}")
+    print(f"Objectives (minimised): {objectives}")
 
-    conditions = aggregate_by_condition(rows, factor_keys)
-    conditions = add_cost(conditions, args.rate)
+    conditions, n_rows = aggregate_by_condition(args.csv, factor_keys, extra_keys)
+    print(f"Streamed {n_rows} rows from {args.csv}\n")
+    unknown = unknown_partitions(conditions, pricing) if args.pricing else []
+    if unknown:
+        print(f"WARNING: partition(s) {', '.join(unknown)} not in {args.pricing}; billed at "
+              f"'{pricing['default_partition']}' rates", file=sys.stderr)
+    conditions = add_cost(conditions, pricing, args.mem_gb)
+    frontier = dominance_ranks(conditions, objectives)    # computed once, reused below
 
     # Print sorted by cost
     conditions.sort(key=lambda c: c["cost_med_usd"])
     print(f"=== {len(conditions)} unique conditions (sorted by cost) ===")
     print(f"{'#':>3}  " + "  ".join(f"{k:>14}" for k in factor_keys) +
-          f"  {'wall_s':>8}  {'cpu-hr':>8}  {'$/sample':>9}  {'on_pareto':>10}")
-    pareto = set(id(c) for c in pareto_frontier(conditions))
+          f"  {'wall_s':>8}  {'cpu-hr':>8}  {'$/sample':>9}  {'rss_GB':>7}  {'rank':>5}")
     for i, c in enumerate(conditions, 1):
-        is_pareto = "*" if id(c) in pareto else ""
         line = f"{i:>3}  " + "  ".join(f"{c[k]:>14}" for k in factor_keys)
-        line += f"  {c['wall_med']:>8.2f}  {c['cpu_hours_med']:>8.4f}  ${c['cost_med_usd']:>8.4f}  {is_pareto:>10}"
+        line += (f"  {c['wall_med']:>8.2f}  {c['cpu_hours_med']:>8.4f}  ${c['cost_med_usd']:>8.4f}"
+                 f"  {c['peak_rss_gb_med']:>7.2f}  {c['pareto_rank']:>4}{'*' if c['pareto_rank'] == 1 else ' '}")
         print(line)
 
-    print(f"\nCost-Pareto frontier ({sum(1 for _ in pareto_frontier(conditions))} configs):")
-    for c in pareto_frontier(conditions):
+    print(f"\nPareto frontier over {', '.join(objectives)} ({len(frontier)} configs):")
+    for c in frontier:
         msg = ", ".join(f"{k}={c[k]}" for k in factor_keys)
-        print(f"  {msg}  ->  {c['wall_med']:.2f}s  ${c['cost_med_usd']:.4f}")
+        print(f"  {msg}  ->  {c['wall_med']:.2f}s  ${c['cost_med_usd']:.4f}  {c['peak_rss_gb_med']:.2f} GB")
 
     # Write CSV
     out_keys = factor_keys + ["n", "wall_med", "wall_min", "wall_max",
                               "threads", "cpu_hours_med", "cost_med_usd",
-                              "cost_lo_usd", "cost_hi_usd", "on_pareto"]
-    pareto_ids = pareto
+                              "cost_lo_usd", "cost_hi_usd", "peak_rss_gb_med",
+                              "partition", "gpus", "gb_hours_med"] + \
+               [k for k in extra_keys if k not in factor_keys] + ["pareto_rank", "on_pareto"]
     with open(args.output, "w", newline="") as f:
         w = csv.DictWriter(f, fieldnames=out_keys)
         w.writeheader()
         for c in conditions:
             row = {k: c.get(k, "") for k in out_keys}
-            row["on_pareto"] = "yes" if id(c) in pareto_ids else "no"
+            row["on_pareto"] = "yes" if c["pareto_rank"] == 1 else "no"
             w.writerow(row)
     print(f"\nSaved: {args.output}")
+
+    if args.sweep_gb_ratios:
+        ratios = [float(x) for x in args.sweep_gb_ratios.split(",")]
+        sweep = sweep_gb_ratios(conditions, pricing, ratios, args.mem_gb, args.max_wall)
+        print(f"\n=== GB-hour : core-hour ratio sweep (recommended = cheapest"
+              f"{'' if args.max_wall is None else f' with wall <= {args.max_wall}s'}) ===")
+        prev = None
+        for ratio, idx, cost in sweep:
+            c = conditions[idx]
+            msg = ", ".join(f"{k}={c[k]}" for k in factor_keys)
+            flag = "  <- changes" if prev is not None and idx != prev else ""
+            print(f"  ratio={ratio:<8g} ${cost:>8.4f}  {msg}{flag}")
+            prev = idx
+        if args.sweep_output:
+            with open(args.sweep_output, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(["gb_to_core_ratio", "cost_usd"] + factor_keys)
+                for ratio, idx, cost in sweep:
+                    w.writerow([ratio, cost] + [conditions[idx][k] for k in factor_keys])
+            print(f"Saved: {args.sweep_output}")
+
     print(f"\nUSAGE NOTE: a config on the Pareto frontier is the optimum for *some* user.")
     print("If $/sample matters, pick a frontier point with low cost and acceptable wall.")
     print("If wall matters, pick the fastest frontier point regardless of cost.")
+    print("If scheduling is memory-bound, pick the frontier point with the smallest peak RSS.")
 
 
 if __name__ == "__main__":
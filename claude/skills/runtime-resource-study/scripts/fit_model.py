@@ -4,28 +4,38 @@
 # Purpose: Fit wall_s ~ N (and optionally + file_size) and peak_rss ~ N. Run variance
 # partitioning (between-host vs within-condition vs residual). If a separate validation
 # CSV is supplied, compute out-of-sample prediction error and decide whether to recommend
-# the 1-term or 2-term model. Output: model.yaml.
+# the 1-term or 2-term model. If a Stage 2 thread-sweep CSV is supplied, fit an
+# Amdahl-style scaling curve (serial + parallel + contention) and emit a joint
+# wall(N, threads) predictor with a recommended thread count. Candidate wall ~ N models
+# (OLS, Huber, Theil-Sen, power law, N log N) are ranked by k-fold cross-validated
+# error and the winner recorded. Peak RSS is also fit as a two-segment model to detect
+# the in-memory -> spill breakpoint, with the wall-time penalty past it. Output: model.yaml.
+# Inputs are read column-wise in chunks via bench_io.py, so pooled multi-million-row
+# CSVs and .parquet tables load with bounded memory.
 #
 # Usage:
 #   python fit_model.py --csv <stage5/benchmark.csv> [--validation-csv <stage6/benchmark.csv>] --output model.yaml
 #
 # Optional: --variance-partition --rss-cap <GB>
+#           --thread-sweep-csv <stage2/benchmark.csv> [--target-efficiency 0.7]
+#           --cv-folds 5 --cv-jobs 4
 
 import argparse
-import csv
-import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
 
+from bench_io import FLOAT, STR, coalesce, read_columns
 
-def read_csv_dict(path):
-    rows = []
-    with open(path) as f:
-        for r in csv.DictReader(f):
-            rows.append(r)
-    return rows
+BENCH_COLUMNS = {
+    "run_id": STR, "host": STR,
+    "threads": STR, "mem_per_thread": STR, "compression_level": STR,
+    "wall_s": FLOAT, "peak_rss_kb": FLOAT,
+    "primary_records": FLOAT, "n_records": FLOAT,
+    "file_size_bytes": FLOAT, "output_bytes": FLOAT,
+}
 
 
 def fit_linear(X, y):
@@ -38,28 +48,293 @@ def fit_linear(X, y):
     return coefs, pred, r2
 
 
-def variance_partition(rows):
+# ---------------------------------------------------------------------------
+# Candidate wall ~ N models for cross-validated selection. Each fit_* returns a
+# coefficient vector; predict_candidate() maps (name, coefs, N) -> wall.
+# ---------------------------------------------------------------------------
+def fit_ols(N, y):
+    coefs, *_ = np.linalg.lstsq(np.vstack([np.ones_like(N), N]).T, y, rcond=None)
+    return coefs
+
+
+def fit_huber(N, y, delta=1.345, n_iter=50):
+    """Huber M-estimator via IRLS, residual scale from the MAD. Down-weights the
+    handful of runs that landed on a slow node instead of letting them pull b."""
+    A = np.vstack([np.ones_like(N), N]).T
+    coefs = fit_ols(N, y)
+    for _ in range(n_iter):
+        resid = y - A @ coefs
+        scale = 1.4826 * np.median(np.abs(resid - np.median(resid)))
+        if scale <= 0:
+            break
+        u = np.abs(resid) / (delta * scale)
+        w = np.where(u <= 1, 1.0, 1.0 / np.maximum(u, 1e-12))
+        sw = np.sqrt(w)
+        new, *_ = np.linalg.lstsq(A * sw[:, None], y * sw, rcond=None)
+        if np.allclose(new, coefs, rtol=1e-8, atol=1e-12):
+            coefs = new
+            break
+        coefs = new
+    return coefs
+
+
+THEIL_SEN_MAX_PAIRS = 1_000_000
+
+
+def fit_theil_sen(N, y, max_pairs=THEIL_SEN_MAX_PAIRS, seed=42):
+    """Median of pairwise slopes; intercept is the median residual. Above max_pairs
+    pairs (~1400 rows) the slopes come from a seeded random sample of max_pairs pairs
+    instead of all n(n-1)/2, so memory stays bounded inside each CV worker."""
+    n = len(N)
+    if n * (n - 1) // 2 <= max_pairs:
+        i, j = np.triu_indices(n, k=1)
+    else:
+        i, j = np.random.default_rng(seed).integers(0, n, size=(2, max_pairs))
+    dx = N[j] - N[i]
+    keep = dx != 0
+    if not keep.any():
+        return fit_ols(N, y)
+    b = np.median((y[j] - y[i])[keep] / dx[keep])
+    return np.array([np.median(y - b * N), b])
+
+
+def fit_power_law(N, y):
+    """log(wall) = log(a) + k * log(N)  ->  wall = a * N^k."""
+    keep = (N > 0) & (y > 0)
+    A = np.vstack([np.ones(keep.sum()), np.log(N[keep])]).T
+    (log_a, k), *_ = np.linalg.lstsq(A, np.log(y[keep]), rcond=None)
+    return np.array([np.exp(log_a), k])
+
+
+def fit_nlogn(N, y):
+    """wall = a + b * N * log2(N) — comparison sorts that stay in memory."""
+    X = N * np.log2(np.maximum(N, 2))
+    coefs, *_ = np.linalg.lstsq(np.vstack([np.ones_like(N), X]).T, y, rcond=None)
+    return coefs
+
+
+CANDIDATE_MODELS = {
+    "linear_ols":       (fit_ols,        "wall_s = a + b * N_primary_records"),
+    "linear_huber":     (fit_huber,      "wall_s = a + b * N_primary_records  (Huber IRLS)"),
+    "linear_theil_sen": (fit_theil_sen,  "wall_s = a + b * N_primary_records  (Theil-Sen)"),
+    "power_law":        (fit_power_law,  "wall_s = a * N_primary_records ^ k"),
+    "n_log_n":          (fit_nlogn,      "wall_s = a + b * N_primary_records * log2(N_primary_records)"),
+}
+
+
+MAPE_FLOOR_S = 1e-3     # seconds; denominator floor for CV percentage errors
+
+
+def predict_candidate(name, coefs, N):
+    if name == "power_law":
+        return coefs[0] * np.power(N, coefs[1])
+    if name == "n_log_n":
+        return coefs[0] + coefs[1] * N * np.log2(np.maximum(N, 2))
+    return coefs[0] + coefs[1] * N
+
+
+def _cv_fold(task):
+    """One (model, fold) evaluation — module-level so ProcessPoolExecutor can pickle it."""
+    name, N_train, y_train, N_test, y_test = task
+    coefs = CANDIDATE_MODELS[name][0](N_train, y_train)
+    pred = predict_candidate(name, coefs, N_test)
+    # Floor the denominator so a wall_s == 0 row can't turn a model's MAPE into inf/NaN
+    return name, np.abs(y_test - pred) / np.maximum(np.abs(y_test), MAPE_FLOOR_S)
+
+
+def select_wall_model(N, y, k=5, n_jobs=1, seed=42):
+    """K-fold cross-validated model selection over CANDIDATE_MODELS.
+    Error metric is mean absolute percentage error, matching how validation is reported.
+    Folds are evaluated in parallel across n_jobs processes."""
+    k = max(2, min(k, len(N)))
+    folds = np.random.default_rng(seed).permutation(len(N)) % k
+    tasks = []
+    for name in CANDIDATE_MODELS:
+        for f in range(k):
+            tr, te = folds != f, folds == f
+            tasks.append((name, N[tr], y[tr], N[te], y[te]))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            results = list(ex.map(_cv_fold, tasks))
+    else:
+        results = [_cv_fold(t) for t in tasks]
+
+    errors = {name: [] for name in CANDIDATE_MODELS}
+    for name, err in results:
+        errors[name].extend(err.tolist())
+    scores = {name: 100 * float(np.mean(e)) for name, e in errors.items()}
+    winner = min(scores, key=scores.get)
+    coefs = CANDIDATE_MODELS[winner][0](N, y)
+    return {
+        "k_folds": k,
+        "cv_mape_pct": scores,
+        "winner": winner,
+        "formula": CANDIDATE_MODELS[winner][1],
+        "coefs": coefs,
+    }
+
+
+def _bic(ss_res, n, k):
+    return n * np.log(max(ss_res, 1e-300) / n) + k * np.log(n)
+
+
+def fit_rss_breakpoint(N, R, min_side=3):
+    """Segmented regression of peak RSS on N with one unknown breakpoint.
+
+    Grid-searches breakpoints between consecutive distinct N values (>= min_side distinct
+    input sizes per side) and fits an independent line to each segment. The in-memory
+    regime (left) grows with N until the tool hits -m * threads and starts spilling; the
+    spill regime (right) is typically flat or much shallower. The breakpoint is accepted
+    only if the two-segment fit beats the single line on BIC."""
+    order = np.argsort(N)
+    N, R = N[order], R[order]
+    levels = np.unique(N)
+    if len(levels) < 2 * min_side:
+        return None
+    n = len(N)
+    _, pred1, _ = fit_linear(np.vstack([np.ones_like(N), N]).T, R)
+    bic_line = _bic(np.sum((R - pred1) ** 2), n, 2)
+
+    best = None
+    for i in range(min_side, len(levels) - min_side + 1):
+        bp = 0.5 * (levels[i - 1] + levels[i])
+        left, right = N < bp, N >= bp
+        cL, pL, _ = fit_linear(np.vstack([np.ones(left.sum()), N[left]]).T, R[left])
+        cR, pR, _ = fit_linear(np.vstack([np.ones(right.sum()), N[right]]).T, R[right])
+        ss = np.sum((R[left] - pL) ** 2) + np.sum((R[right] - pR) ** 2)
+        if best is None or ss < best["ss_res"]:
+            best = {"breakpoint_N": float(bp), "in_memory": cL, "spill": cR, "ss_res": float(ss),
+                    "n_in_memory": int(left.sum()), "n_spill": int(right.sum())}
+    best["bic_single_line"] = float(bic_line)
+    best["bic_segmented"] = float(_bic(best["ss_res"], n, 5))    # 2 lines + breakpoint
+    best["detected"] = best["bic_segmented"] < bic_line
+    best["rss_at_breakpoint_GB"] = float(best["in_memory"][0] + best["in_memory"][1] * best["breakpoint_N"])
+    return best
+
+
+def fit_spill_wall_penalty(N, T, breakpoint_N):
+    """Hinge fit wall = a + b*N + c*max(0, N - breakpoint_N). c is the extra wall
+    per record once the tool leaves the in-memory regime."""
+    A = np.vstack([np.ones_like(N), N, np.maximum(0.0, N - breakpoint_N)]).T
+    coefs, _, r2 = fit_linear(A, T)
+    return coefs, r2
+
+
+def fit_thread_scaling(table, run_id_prefix="sw-threads"):
+    """Fit wall(p) = alpha + beta/p + gamma*(p - 1) to the Stage 2 thread sweep.
+
+    alpha is the serial time, beta the perfectly parallel time and gamma a per-thread
+    contention cost (lock / memory-bandwidth / L3 pressure). Normalised by
+    T(1) = alpha + beta these give the serial fraction, parallel fraction and
+    contention term of an Amdahl model with a USL-style penalty. Uses the median wall
+    per thread count so replicates don't over-weight noisy levels. Also returns the
+    Karp-Flatt experimentally determined serial fraction per thread count."""
+    in_sweep = np.array([rid.startswith(run_id_prefix) for rid in table["run_id"]], dtype=bool)
+    if not in_sweep.any():
+        in_sweep[:] = True    # CSV already restricted to the thread sweep
+    threads = np.array([float(t) if t.strip().isdigit() else np.nan for t in table["threads"]])
+    ok = in_sweep & np.isfinite(threads) & np.isfinite(table["wall_s"])
+    by_p = {}
+    for p, w in zip(threads[ok].astype(int), table["wall_s"][ok]):
+        by_p.setdefault(int(p), []).append(float(w))
+    if len(by_p) < 3:
+        return None     # 3 coefficients need >= 3 thread levels
+
+    P = np.array(sorted(by_p), dtype=float)
+    Tp = np.array([np.median(by_p[int(p)]) for p in P])
+    A = np.vstack([np.ones_like(P), 1.0 / P, P - 1]).T
+    coefs, pred, r2 = fit_linear(A, Tp)
+    if coefs[0] < 0:
+        # Negative serial time is unphysical — refit with alpha pinned at 0
+        sub, *_ = np.linalg.lstsq(A[:, 1:], Tp, rcond=None)
+        coefs = np.array([0.0, sub[0], sub[1]])
+        pred = A @ coefs
+        ss_tot = np.sum((Tp - Tp.mean()) ** 2)
+        r2 = 1 - np.sum((Tp - pred) ** 2) / ss_tot if ss_tot > 0 else float("nan")
+    alpha, beta, gamma = coefs
+    t1 = alpha + beta
+
+    # Karp-Flatt: e = (1/speedup - 1/p) / (1 - 1/p), using the observed T(1) if tested
+    t1_obs = Tp[0] if P[0] == 1 else t1
+    per_p = []
+    for p, t in zip(P, Tp):
+        speedup = t1_obs / t
+        kf = (1 / speedup - 1 / p) / (1 - 1 / p) if p > 1 else float("nan")
+        per_p.append({"threads": int(p), "wall_med_s": float(t), "speedup": float(speedup),
+                      "efficiency": float(speedup / p), "karp_flatt_serial": float(kf)})
+
+    return {
+        "alpha_s": float(alpha), "beta_s": float(beta), "gamma_s": float(gamma),
+        "t1_s": float(t1),
+        "serial_fraction": float(alpha / t1) if t1 > 0 else float("nan"),
+        "parallel_fraction": float(beta / t1) if t1 > 0 else float("nan"),
+        "contention": float(gamma / t1) if t1 > 0 else float("nan"),
+        "r_squared": float(r2),
+        "threads_tested": [int(p) for p in P],
+        "per_thread": per_p,
+    }
+
+
+def scaling_factor(ts, p):
+    """Relative wall time at p threads, normalised so that T(1) = 1."""
+    return ts["serial_fraction"] + ts["parallel_fraction"] / p + ts["contention"] * (p - 1)
+
+
+def recommend_threads(ts, target_efficiency, max_threads):
+    """Largest thread count whose predicted parallel efficiency T(1) / (p * T(p)) stays
+    at or above target_efficiency, plus the wall-minimising thread count."""
+    ps = np.arange(1, max_threads + 1)
+    f = np.array([scaling_factor(ts, p) for p in ps])
+    eff = 1.0 / (ps * f)
+    ok = ps[eff >= target_efficiency]
+    p_eff = int(ok.max()) if ok.size else 1
+    p_fast = int(ps[np.argmin(f)])
+    # Gustafson scaled speedup at the recommended count (problem grows with p)
+    gustafson = p_eff - ts["serial_fraction"] * (p_eff - 1)
+    return {
+        "threads_for_target_efficiency": p_eff,
+        "predicted_efficiency": float(eff[p_eff - 1]),
+        "predicted_speedup": float(1.0 / f[p_eff - 1]),
+        "threads_min_wall": p_fast,
+        "gustafson_scaled_speedup": float(gustafson),
+    }
+
+
+def safety_quantiles(obs, pred, qs=(0.5, 0.9, 0.95, 0.99)):
+    """Quantiles of obs/pred on the calibration set. Multiplying a point prediction by
+    the q95 ratio gives a request that would have covered 95% of calibration runs.
+    Floored at 1.0 so a quantile never shrinks the point prediction."""
+    keep = pred > 0
+    ratio = obs[keep] / pred[keep]
+    if ratio.size == 0:
+        return {}
+    return {f"q{int(round(q * 100))}": max(1.0, float(np.quantile(ratio, q))) for q in qs}
+
+
+def _group_ss(values, labels, grand):
+    """Between-group sum of squares of values grouped by labels (vectorised)."""
+    uniq, inv = np.unique(labels, return_inverse=True)
+    sums = np.bincount(inv, weights=values)
+    counts = np.bincount(inv)
+    means = sums / counts
+    return float(np.sum(counts * (means - grand) ** 2)), len(uniq)
+
+
+def variance_partition(table):
     """Crude variance partition: between-condition, between-host, residual.
     Without statsmodels we approximate with sum-of-squares decomposition.
     For a proper mixed-effects fit, use the R recipe in references/analysis_recipes.md."""
-    walls = np.array([float(r["wall_s"]) for r in rows])
+    walls = table["wall_s"]
     grand = walls.mean()
     total_ss = np.sum((walls - grand) ** 2)
 
     # Group by condition (a tuple of factor levels) — pull from common samtools-sort columns
     factor_keys = ["threads", "mem_per_thread", "compression_level"]
-    cond_keys = [tuple(r.get(k, "") for k in factor_keys) for r in rows]
-    unique_conds = list(set(cond_keys))
-    cond_means = {c: np.mean([float(r["wall_s"]) for r, ck in zip(rows, cond_keys) if ck == c])
-                  for c in unique_conds}
-    cond_ss = sum((cond_means[ck] - grand) ** 2 for ck in cond_keys)
+    cond_keys = np.array(["\x1f".join(t) for t in zip(*(table[k] for k in factor_keys))])
+    cond_ss, n_conds = _group_ss(walls, cond_keys, grand)
 
     # Group by host
-    host_keys = [r.get("host", "") for r in rows]
-    unique_hosts = list(set(host_keys))
-    host_means = {h: np.mean([float(r["wall_s"]) for r, hk in zip(rows, host_keys) if hk == h])
-                  for h in unique_hosts}
-    host_ss = sum((host_means[hk] - grand) ** 2 for hk in host_keys)
+    host_ss, n_hosts = _group_ss(walls, table["host"].astype(str), grand)
 
     residual_ss = total_ss - cond_ss - host_ss
     if residual_ss < 0:
@@ -68,16 +343,16 @@ def variance_partition(rows):
         "condition_pct": 100 * cond_ss / total_ss if total_ss > 0 else 0,
         "host_pct":      100 * host_ss / total_ss if total_ss > 0 else 0,
         "residual_pct":  100 * residual_ss / total_ss if total_ss > 0 else 0,
-        "n_obs":         len(rows),
-        "n_conditions":  len(unique_conds),
-        "n_hosts":       len(unique_hosts),
+        "n_obs":         len(walls),
+        "n_conditions":  n_conds,
+        "n_hosts":       n_hosts,
     }
 
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--csv", required=True, help="Calibration benchmark.csv (Stage 5)")
-    p.add_argument("--validation-csv", default=None, help="Held-out benchmark.csv (Stage 6)")
+    p.add_argument("--csv", required=True, help="Calibration benchmark.csv or .parquet (Stage 5)")
+    p.add_argument("--validation-csv", default=None, help="Held-out benchmark.csv or .parquet (Stage 6)")
     p.add_argument("--manifest", default=None,
                    help="Optional manifest.tsv with primary_records column to merge")
     p.add_argument("--output", default="model.yaml")
@@ -85,35 +360,42 @@ def main():
                    help="Optional RSS saturation cap in GB")
     p.add_argument("--variance-partition", action="store_true")
     p.add_argument("--threads-calibrated", type=int, default=32)
+    p.add_argument("--thread-sweep-csv", default=None,
+                   help="Stage 2 benchmark.csv containing the threads sweep")
+    p.add_argument("--thread-sweep-prefix", default="sw-threads",
+                   help="run_id prefix selecting thread-sweep rows (default: sw-threads)")
+    p.add_argument("--target-efficiency", type=float, default=0.7,
+                   help="Parallel efficiency floor for the recommended thread count (default: 0.7)")
+    p.add_argument("--max-threads", type=int, default=None,
+                   help="Upper bound for the thread recommendation (default: max tested)")
+    p.add_argument("--cv-folds", type=int, default=5,
+                   help="Folds for cross-validated wall-model selection (default: 5)")
+    p.add_argument("--cv-jobs", type=int, default=1,
+                   help="Parallel processes for CV fold evaluation (default: 1)")
     args = p.parse_args()
 
-    rows = read_csv_dict(args.csv)
+    table = read_columns(args.csv, BENCH_COLUMNS)
     if args.manifest:
-        # Merge primary_records from manifest into rows by run_id
-        man = {r["run_id"]: r for r in read_csv_dict(args.manifest)}
-        for r in rows:
-            if r["run_id"] in man and "primary_records" not in r:
-                r["primary_records"] = man[r["run_id"]].get("primary_records", "0")
-
-    # Filter to rows with valid wall_s and primary_records
-    valid = []
-    for r in rows:
-        try:
-            r["wall_s_f"] = float(r["wall_s"])
-            r["primary_records_f"] = float(r.get("primary_records", r.get("n_records", 0)))
-            r["file_size_bytes_f"] = float(r.get("file_size_bytes", r.get("output_bytes", 0)))
-            r["peak_rss_kb_f"] = float(r["peak_rss_kb"])
-            valid.append(r)
-        except (KeyError, ValueError):
-            continue
-    if not valid:
-        print("ERROR: no valid rows with wall_s + primary_records", file=sys.stderr)
+        # Backfill primary_records from the manifest by run_id, row by row
+        man = read_columns(args.manifest, {"run_id": STR, "primary_records": FLOAT})
+        lookup = dict(zip(man["run_id"], man["primary_records"]))
+        col = table["primary_records"]
+        table["primary_records"] = np.where(
+            np.isfinite(col), col, np.array([lookup.get(rid, np.nan) for rid in table["run_id"]]))
+
+    # Filter to rows with valid wall_s, record count and peak RSS
+    n_records = coalesce(table["primary_records"], table["n_records"])
+    file_size = coalesce(table["file_size_bytes"], table["output_bytes"], default=0.0)
+    ok = np.isfinite(table["wall_s"]) & np.isfinite(table["peak_rss_kb"]) & np.isfinite(n_records)
+    if not ok.any():
+        print("ERROR: no valid rows with wall_s + peak_rss_kb + primary_records", file=sys.stderr)
         sys.exit(1)
+    valid = {k: v[ok] for k, v in table.items()}
 
-    N = np.array([r["primary_records_f"] for r in valid])
-    F = np.array([r["file_size_bytes_f"] for r in valid])
-    T = np.array([r["wall_s_f"] for r in valid])
-    R = np.array([r["peak_rss_kb_f"] for r in valid]) / (1024 ** 2)   # GB
+    N = n_records[ok]
+    F = file_size[ok]
+    T = valid["wall_s"]
+    R = valid["peak_rss_kb"] / (1024 ** 2)   # GB
 
     # 1-term: wall = a + b*N
     A1 = np.vstack([np.ones_like(N), N]).T
@@ -132,25 +414,45 @@ def main():
         print(f"2-term wall: a={c2[0]:.3f}, b={c2[1]*1e6:.3f} us/record, c={c2[2]*1e9:.3f} ns/byte, R^2={r2_2:.4f}")
     print(f"RSS:         a={cR[0]:.3f} GB, b/record={cR[1]*1024**3:.0f} bytes, R^2={r2_R:.4f}")
 
+    rss_seg, spill_wall = None, None
+    rss_seg = fit_rss_breakpoint(N, R)
+    if rss_seg and rss_seg["detected"]:
+        spill_wall = fit_spill_wall_penalty(N, T, rss_seg["breakpoint_N"])
+        print(f"RSS breakpoint: N={rss_seg['breakpoint_N']:.4g} records "
+              f"(rss={rss_seg['rss_at_breakpoint_GB']:.2f} GB); "
+              f"spill slope={rss_seg['spill'][1]*1024**3:.0f} bytes/record; "
+              f"wall penalty={spill_wall[0][2]*1e6:.3f} us/record past breakpoint")
+        if args.rss_cap and abs(rss_seg["rss_at_breakpoint_GB"] - args.rss_cap) > 0.25 * args.rss_cap:
+            print(f"WARNING: detected saturation {rss_seg['rss_at_breakpoint_GB']:.2f} GB "
+                  f"differs from --rss-cap {args.rss_cap} GB by > 25%", file=sys.stderr)
+    elif rss_seg:
+        print("RSS breakpoint: none (single line preferred by BIC)")
+
+    model_sel = None
+    if len(N) >= 4:
+        model_sel = select_wall_model(N, T, k=args.cv_folds, n_jobs=args.cv_jobs)
+        print(f"\n{model_sel['k_folds']}-fold CV (MAPE %):")
+        for name, err in sorted(model_sel["cv_mape_pct"].items(), key=lambda kv: kv[1]):
+            print(f"  {name:<18} {err:7.2f}{'  <- winner' if name == model_sel['winner'] else ''}")
+
     # Out-of-sample validation
     val_residuals = None
     chosen_model = "wall_model_v1"
     if args.validation_csv:
-        val_rows = read_csv_dict(args.validation_csv)
+        vt = read_columns(args.validation_csv, BENCH_COLUMNS)
+        vN = coalesce(vt["primary_records"], default=0.0)
+        vF = coalesce(vt["file_size_bytes"], vt["output_bytes"], default=0.0)
         val_residuals = []
-        for r in val_rows:
-            try:
-                Tv = float(r["wall_s"])
-                Nv = float(r.get("primary_records", 0))
-                Fv = float(r.get("file_size_bytes", r.get("output_bytes", 0)))
-            except (KeyError, ValueError):
+        for run_id, Tv, Nv, Fv in zip(vt["run_id"], vt["wall_s"], vN, vF):
+            if not np.isfinite(Tv):
                 continue
+            Tv, Nv, Fv = float(Tv), float(Nv), float(Fv)
             pred1 = c1[0] + c1[1] * Nv
             pred2 = c2[0] + c2[1] * Nv + c2[2] * Fv if c2 is not None else None
             err1 = 100 * (Tv - pred1) / pred1 if pred1 else float("nan")
             err2 = 100 * (Tv - pred2) / pred2 if pred2 else float("nan")
             val_residuals.append({
-                "run_id": r["run_id"],
+                "run_id": run_id,
                 "n_primary": Nv, "file_size_bytes": Fv, "obs": Tv,
                 "pred_1term": pred1, "err_1term_pct": err1,
                 "pred_2term": pred2, "err_2term_pct": err2,
@@ -165,6 +467,41 @@ def main():
 
     var_part = variance_partition(valid) if args.variance_partition else None
 
+    # Calibration obs/pred ratios -> multiplicative safety quantiles for predict_resources.py
+    wall_pred = A1 @ c1 if chosen_model == "wall_model_v1" else A2 @ c2
+    rss_pred = A1 @ cR
+    if rss_seg and rss_seg["detected"]:
+        bp = rss_seg["breakpoint_N"]
+        rss_pred = np.where(N < bp, rss_seg["in_memory"][0] + rss_seg["in_memory"][1] * N,
+                            rss_seg["spill"][0] + rss_seg["spill"][1] * N)
+    pred_intervals = {
+        "wall_ratio": safety_quantiles(T, wall_pred),
+        "rss_ratio": safety_quantiles(R, rss_pred),
+    }
+    # The CV winner gets its own wall quantiles: v1/v2 residuals don't describe its errors
+    cv_wall_ratio = (safety_quantiles(T, predict_candidate(model_sel["winner"], model_sel["coefs"], N))
+                     if model_sel else {})
+
+    thread_scaling, thread_rec = None, None
+    if args.thread_sweep_csv:
+        thread_scaling = fit_thread_scaling(read_columns(args.thread_sweep_csv, BENCH_COLUMNS),
+                                            args.thread_sweep_prefix)
+        if thread_scaling is None:
+            print("WARNING: thread sweep has < 3 thread levels; skipping scaling fit", file=sys.stderr)
+        else:
+            max_p = args.max_threads or max(thread_scaling["threads_tested"])
+            thread_rec = recommend_threads(thread_scaling, args.target_efficiency, max_p)
+            ts = thread_scaling
+            print(f"\nThread scaling: serial={ts['serial_fraction']:.3f}, "
+                  f"parallel={ts['parallel_fraction']:.3f}, contention={ts['contention']:.2e}, "
+                  f"R^2={ts['r_squared']:.4f}")
+            for e in ts["per_thread"]:
+                print(f"  t={e['threads']:>3}  wall={e['wall_med_s']:>9.2f}s  "
+                      f"speedup={e['speedup']:>6.2f}  eff={e['efficiency']:.2f}  "
+                      f"karp_flatt={e['karp_flatt_serial']:.3f}")
+            print(f"-> {thread_rec['threads_for_target_efficiency']} threads keeps efficiency "
+                  f">= {args.target_efficiency} (fastest: {thread_rec['threads_min_wall']})")
+
     # ============================================================
     # Write model.yaml
     # ============================================================
@@ -172,7 +509,7 @@ def main():
     out_yaml.append(f"# Predictive model")
     out_yaml.append(f"# Calibration: {args.csv}")
     out_yaml.append(f"# Threads:     {args.threads_calibrated}")
-    out_yaml.append(f"# n_observations: {len(valid)}")
+    out_yaml.append(f"# n_observations: {len(T)}")
     out_yaml.append("")
     out_yaml.append("wall_model_v1:")
     out_yaml.append(f'  formula:        "wall_s = a + b * N_primary_records"')
@@ -196,8 +533,103 @@ def main():
     out_yaml.append(f"  r_squared:      {r2_R:.5f}")
     if args.rss_cap:
         out_yaml.append(f"  saturation_cap_GB: {args.rss_cap}")
+    if rss_seg:
+        out_yaml.append("")
+        out_yaml.append("rss_model_piecewise:")
+        out_yaml.append(f'  formula: |')
+        out_yaml.append(f"    rss_GB = a_mem + b_mem * N    for N <  breakpoint_N (in-memory)")
+        out_yaml.append(f"    rss_GB = a_spill + b_spill * N  for N >= breakpoint_N (spill)")
+        out_yaml.append(f"  breakpoint_detected: {str(rss_seg['detected']).lower()}")
+        out_yaml.append(f"  breakpoint_N:   {rss_seg['breakpoint_N']:.0f}")
+        out_yaml.append(f"  saturation_cap_GB_detected: {rss_seg['rss_at_breakpoint_GB']:.4f}")
+        out_yaml.append(f"  a_mem_GB:       {rss_seg['in_memory'][0]:.4f}")
+        out_yaml.append(f"  b_mem_bytes_per_record: {rss_seg['in_memory'][1]*1024**3:.0f}")
+        out_yaml.append(f"  a_spill_GB:     {rss_seg['spill'][0]:.4f}")
+        out_yaml.append(f"  b_spill_bytes_per_record: {rss_seg['spill'][1]*1024**3:.0f}")
+        out_yaml.append(f"  n_in_memory:    {rss_seg['n_in_memory']}")
+        out_yaml.append(f"  n_spill:        {rss_seg['n_spill']}")
+        out_yaml.append(f"  bic_single_line: {rss_seg['bic_single_line']:.3f}")
+        out_yaml.append(f"  bic_segmented:  {rss_seg['bic_segmented']:.3f}")
+        out_yaml.append(f'  sizing_rule:    "mem >= a_mem_GB + b_mem * N (in-memory line) keeps the run below the spill threshold"')
+        if spill_wall:
+            (a, b, c), r2 = spill_wall
+            out_yaml.append("  spill_wall_penalty:")
+            out_yaml.append(f'    formula:      "wall_s = a + b * N + c * max(0, N - breakpoint_N)"')
+            out_yaml.append(f"    a_seconds:    {a:.4f}")
+            out_yaml.append(f"    b_us_per_record: {b*1e6:.4f}")
+            out_yaml.append(f"    c_us_per_record_past_breakpoint: {c*1e6:.4f}")
+            out_yaml.append(f"    r_squared:    {r2:.5f}")
     out_yaml.append("")
-    out_yaml.append(f"recommended_model: {chosen_model}")
+    out_yaml.append(f"recommended_model: {chosen_model}    # default wall model for "
+                    "predict_resources.py, simulate_cohort.py and init_project.py")
+    out_yaml.append("")
+    out_yaml.append("prediction_intervals:")
+    out_yaml.append('  description: "Calibration obs/pred ratio quantiles; multiply a point prediction to get a safe request"')
+    for key, qd in pred_intervals.items():
+        if qd:
+            out_yaml.append(f"  {key}:")
+            for q, v in qd.items():
+                out_yaml.append(f"    {q}: {v:.4f}")
+    if model_sel:
+        w = model_sel["winner"]
+        c = model_sel["coefs"]
+        out_yaml.append("")
+        out_yaml.append("wall_model_cv:")
+        out_yaml.append(f"  winner:         {w}")
+        out_yaml.append(f'  formula:        "{model_sel["formula"]}"')
+        out_yaml.append('  used_by: "predict_resources.py / simulate_cohort.py only with --wall-model '
+                        'wall_model_cv; by default every downstream tool (incl. init_project.py '
+                        '--resource-model) uses recommended_model"')
+        if w == "power_law":
+            out_yaml.append(f"  a_seconds:      {c[0]:.6g}")
+            out_yaml.append(f"  k_exponent:     {c[1]:.5f}")
+        elif w == "n_log_n":
+            out_yaml.append(f"  a_seconds:      {c[0]:.4f}")
+            out_yaml.append(f"  b_us_per_record_log2: {c[1]*1e6:.6f}")
+        else:
+            out_yaml.append(f"  a_seconds:      {c[0]:.4f}")
+            out_yaml.append(f"  b_us_per_record: {c[1]*1e6:.4f}")
+        if cv_wall_ratio:
+            out_yaml.append("  wall_ratio:     # safety quantiles for this model (used in place of "
+                            "prediction_intervals.wall_ratio)")
+            for q, v in cv_wall_ratio.items():
+                out_yaml.append(f"    {q}: {v:.4f}")
+        out_yaml.append(f"  k_folds:        {model_sel['k_folds']}")
+        out_yaml.append("  cv_mape_pct:")
+        for name, err in model_sel["cv_mape_pct"].items():
+            out_yaml.append(f"    {name}: {err:.3f}")
+    if thread_scaling:
+        ts = thread_scaling
+        out_yaml.append("")
+        out_yaml.append("thread_scaling:")
+        out_yaml.append(f"  source_csv: \"{args.thread_sweep_csv}\"")
+        out_yaml.append(f'  formula:        "wall_s(p) = T1 * (serial + parallel / p + contention * (p - 1))"')
+        out_yaml.append(f"  T1_seconds:     {ts['t1_s']:.4f}")
+        out_yaml.append(f"  serial_fraction:   {ts['serial_fraction']:.5f}")
+        out_yaml.append(f"  parallel_fraction: {ts['parallel_fraction']:.5f}")
+        out_yaml.append(f"  contention:     {ts['contention']:.6g}")
+        out_yaml.append(f"  r_squared:      {ts['r_squared']:.5f}")
+        out_yaml.append("  per_thread:")
+        for e in ts["per_thread"]:
+            out_yaml.append(f"    - threads: {e['threads']}")
+            out_yaml.append(f"      wall_med_s: {e['wall_med_s']:.3f}")
+            out_yaml.append(f"      speedup: {e['speedup']:.3f}")
+            out_yaml.append(f"      efficiency: {e['efficiency']:.3f}")
+            if e["threads"] > 1:
+                out_yaml.append(f"      karp_flatt_serial: {e['karp_flatt_serial']:.4f}")
+        out_yaml.append("  recommendation:")
+        out_yaml.append(f"    target_efficiency: {args.target_efficiency}")
+        for k, v in thread_rec.items():
+            out_yaml.append(f"    {k}: {v:.3f}" if isinstance(v, float) else f"    {k}: {v}")
+        out_yaml.append("")
+        out_yaml.append("joint_wall_model:")
+        out_yaml.append(f"  formula: |")
+        out_yaml.append(f"    wall_s(N, p) = {chosen_model}(N) * g(p) / g(threads_calib)")
+        out_yaml.append(f"    g(p) = serial_fraction + parallel_fraction / p + contention * (p - 1)")
+        out_yaml.append(f"  base_model:     {chosen_model}")
+        out_yaml.append(f"  threads_calib:  {args.threads_calibrated}")
+        out_yaml.append(f"  g_threads_calib: {scaling_factor(ts, args.threads_calibrated):.6f}")
+        out_yaml.append(f"  recommended_threads: {thread_rec['threads_for_target_efficiency']}")
     if val_residuals:
         out_yaml.append("")
         out_yaml.append("validation:")
@@ -219,13 +651,16 @@ def main():
         for k, v in var_part.items():
             out_yaml.append(f"  {k}: {v:.2f}" if isinstance(v, float) else f"  {k}: {v}")
         if var_part["host_pct"] > 25:
-            out_yaml.append("  warning: \"Host effect > 25% — partition is heterogeneous; identify outlier nodes via R: residuals(lmer(...)) and exclude.\"")
+            out_yaml.append("  warning: \"Host effect > 25% — partition is heterogeneous; run host_speed.py to flag slow nodes (--exclude-out) and refit on --normalised-out.\"")
 
     out_yaml.append("")
     out_yaml.append("caveats:")
     out_yaml.append("  - \"Calibrated on Intel Xeon Gold 6348 (Ice Lake-SP) only\"")
     out_yaml.append("  - \"Valid only when -m * threads >= rss_GB prediction (in-memory regime)\"")
     out_yaml.append("  - \"For inputs ~30x beyond calibration range, validate before trusting\"")
+    if rss_seg and rss_seg["detected"]:
+        out_yaml.append(f"  - \"Spill regime observed above N={rss_seg['breakpoint_N']:.3g} records "
+                        f"(~{rss_seg['rss_at_breakpoint_GB']:.1f} GB); see rss_model_piecewise\"")
 
     Path(args.output).write_text("\n".join(out_yaml) + "\n")
     print(f"\nSaved: {args.output}")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Per-host speed factors from a benchmark table. Fits
+#   log(wall) = condition effect + host effect
+# by median polish (alternating medians — robust to the odd failed / noisy run, and fine
+# with the unbalanced condition × host layout SLURM produces), then flags hosts whose
+# effect is a robust outlier (MAD z-score) and materially slow. Writes a per-host table,
+# an exclude list submit_grid.py reads (EXCLUDE_NODES_FILE), and optionally a copy of the
+# benchmark with wall_s divided by the host factor to feed fit_model.py.
+#
+# Usage:
+#   python host_speed.py --csv benchmark.csv --output host_speed.tsv
+#       [--exclude-out exclude_nodes.txt] [--normalised-out benchmark.hostnorm.csv]
+#       [--z 3.5] [--min-slowdown 1.10] [--min-runs 3] [--condition-cols threads,mem_per_thread]
+
+import argparse
+import csv
+import re
+
+import numpy as np
+
+from bench_io import FLOAT, STR, iter_columns, read_columns, read_header
+
+MAD_SCALE = 1.4826     # MAD -> sigma under normality
+
+
+def short_host(h):
+    """SLURM --exclude wants node names, not FQDNs."""
+    return str(h).split(".")[0]
+
+
+def _group_median(values, codes, n_groups):
+    """Median of values per integer code, vectorised (one lexsort, no Python loop)."""
+    order = np.lexsort((values, codes))
+    v = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    lo = starts + (counts - 1) // 2
+    hi = starts + counts // 2
+    out = np.full(n_groups, np.nan)
+    has = counts > 0
+    out[has] = (v[lo[has]] + v[hi[has]]) / 2
+    return out
+
+
+def median_polish(y, cond, host, max_iter=50, tol=1e-6):
+    """Additive robust fit y ≈ mu + a[cond] + b[host] with median(b) = 0.
+
+    cond/host are integer codes. Returns (mu, a, b)."""
+    a = np.zeros(cond.max() + 1)
+    b = np.zeros(host.max() + 1)
+    for _ in range(max_iter):
+        a_new = _group_median(y - b[host], cond, len(a))
+        b_new = _group_median(y - a_new[cond], host, len(b))
+        b_new -= np.median(b_new)
+        done = max(np.max(np.abs(a_new - a)), np.max(np.abs(b_new - b))) < tol
+        a, b = a_new, b_new
+        if done:
+            break
+    mu = np.median(a)
+    return mu, a - mu, b
+
+
+def host_factors(table, condition_cols=None):
+    """Per-host dict: n_runs, n_conditions, factor (wall multiplier vs the median host),
+    robust_z, and residual MAD of that host's runs. ({}, 0) when no run is usable."""
+    wall = table["wall_s"]
+    ok = np.isfinite(wall) & (wall > 0) & (table["host"] != "")
+    if "exit_status" in table:
+        status = table["exit_status"]
+        ok &= ~np.isfinite(status) | (status == 0)
+    if condition_cols:
+        keys = np.array(["\x1f".join(t) for t in zip(*(table[c] for c in condition_cols))])
+    else:
+        keys = np.array([re.sub(r"_r\d+$", "", r) for r in table["run_id"]])
+    if not ok.any():
+        return {}, 0
+    hosts = np.array([short_host(h) for h in table["host"]])
+    y = np.log(wall[ok])
+    cond_names, cond = np.unique(keys[ok], return_inverse=True)
+    host_names, host = np.unique(hosts[ok], return_inverse=True)
+    mu, a, b = median_polish(y, cond, host)
+    resid = y - mu - a[cond] - b[host]
+
+    mad = np.median(np.abs(b - np.median(b))) * MAD_SCALE
+    out = {}
+    for h, name in enumerate(host_names):
+        m = host == h
+        out[name] = {
+            "n_runs": int(m.sum()),
+            "n_conditions": int(len(np.unique(cond[m]))),
+            "factor": float(np.exp(b[h])),
+            "robust_z": float(b[h] / mad) if mad > 0 else 0.0,
+            "resid_mad": float(np.median(np.abs(resid[m])) * MAD_SCALE),
+        }
+    return out, len(cond_names)
+
+
+def flag_hosts(factors, z, min_slowdown, min_runs):
+    for v in factors.values():
+        v["flag"] = ("slow" if v["n_runs"] >= min_runs and v["robust_z"] > z
+                     and v["factor"] >= min_slowdown else
+                     "fast" if v["n_runs"] >= min_runs and v["robust_z"] < -z else "")
+    return sorted(h for h, v in factors.items() if v["flag"] == "slow")
+
+
+def write_exclude(path, slow):
+    """Merge with any nodes already listed (a node once excluded stays excluded until
+    someone edits the file) and write one comma-separated line, SLURM --exclude style."""
+    existing = []
+    try:
+        with open(path) as f:
+            existing = [n.strip() for n in f.read().replace("\n", ",").split(",") if n.strip()]
+    except FileNotFoundError:
+        pass
+    nodes = sorted(set(existing) | set(slow))
+    with open(path, "w") as f:
+        f.write(",".join(nodes) + "\n")
+    return nodes
+
+
+def write_normalised(src, dst, factors):
+    """Copy of the benchmark with wall_s / host factor. The raw value is kept in
+    wall_s_raw, and host_speed_factor says what was applied (1 for unknown hosts)."""
+    header = read_header(src)
+    if "wall_s" not in header or "host" not in header:
+        raise SystemExit(f"ERROR: {src} needs wall_s and host columns to normalise")
+    cols = {c: STR for c in header}
+    out_header = header + [c for c in ("wall_s_raw", "host_speed_factor") if c not in header]
+    n = 0
+    with open(dst, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(out_header)
+        for chunk in iter_columns(src, cols):
+            walls = chunk["wall_s"]
+            hosts = chunk["host"]
+            for i in range(len(walls)):
+                row = {c: chunk[c][i] for c in header}
+                fac = factors.get(short_host(hosts[i]), {}).get("factor", 1.0)
+                try:
+                    row["wall_s"] = f"{float(walls[i]) / fac:.3f}"
+                except ValueError:
+                    pass
+                row["wall_s_raw"] = walls[i]
+                row["host_speed_factor"] = f"{fac:.4f}"
+                w.writerow([row[c] for c in out_header])
+                n += 1
+    return n
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--csv", required=True, help="benchmark.csv / .parquet / .sqlite")
+    p.add_argument("--output", default="host_speed.tsv")
+    p.add_argument("--exclude-out", default=None,
+                   help="Exclude-list file to update with slow hosts (submit_grid EXCLUDE_NODES_FILE)")
+    p.add_argument("--normalised-out", default=None,
+                   help="Write a copy of the table with wall_s divided by the host factor")
+    p.add_argument("--z", type=float, default=3.5, help="Robust z-score above which a host is slow")
+    p.add_argument("--min-slowdown", type=float, default=1.10,
+                   help="…and its factor must be at least this (ignore statistically-but-not-"
+                        "practically slow hosts)")
+    p.add_argument("--min-runs", type=int, default=3, help="Runs needed before a host can be flagged")
+    p.add_argument("--condition-cols", default=None,
+                   help="Comma-separated factor columns defining a condition "
+                        "(default: run_id without its _r<rep> suffix)")
+    args = p.parse_args()
+
+    condition_cols = args.condition_cols.split(",") if args.condition_cols else None
+    columns = {"run_id": STR, "host": STR, "wall_s": FLOAT, "exit_status": FLOAT}
+    columns.update({c: STR for c in condition_cols or []})
+    table = read_columns(args.csv, columns)
+    factors, n_conds = host_factors(table, condition_cols)
+    if not factors:
+        raise SystemExit(f"ERROR: no successful runs with wall_s > 0 and a host in {args.csv}")
+    slow = flag_hosts(factors, args.z, args.min_slowdown, args.min_runs)
+
+    with open(args.output, "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(["host", "n_runs", "n_conditions", "speed_factor", "robust_z",
+                    "resid_mad", "flag"])
+        for h, v in sorted(factors.items(), key=lambda kv: -kv[1]["factor"]):
+            w.writerow([h, v["n_runs"], v["n_conditions"], f"{v['factor']:.4f}",
+                        f"{v['robust_z']:.2f}", f"{v['resid_mad']:.4f}", v["flag"]])
+    print(f"[host_speed] {len(factors)} hosts over {n_conds} conditions -> {args.output}")
+    for h, v in sorted(factors.items(), key=lambda kv: -kv[1]["factor"])[:5]:
+        print(f"  {h:<20} ×{v['factor']:.3f}  z={v['robust_z']:+.1f}  n={v['n_runs']}  {v['flag']}")
+    if slow:
+        print(f"[host_speed] slow hosts: {','.join(slow)}")
+
+    if args.exclude_out:
+        nodes = write_exclude(args.exclude_out, slow)
+        print(f"[exclude] {','.join(nodes) or '(none)'} -> {args.exclude_out}")
+    if args.normalised_out:
+        n = write_normalised(args.csv, args.normalised_out, factors)
+        print(f"[normalise] {n} rows -> {args.normalised_out} (fit_model.py --csv on this file)")
+
+
+if __name__ == "__main__":
+    main()
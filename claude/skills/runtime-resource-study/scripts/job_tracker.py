@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Wait for a stage's jobs and record what happened to each. Replaces the
+# `until squeue ... | wc -l` drain loop: polls `sacct` for every job id in submitted.tsv
+# in batched calls (BATCH_SIZE ids per call, at least --min-gap seconds between calls,
+# backing off when sacct fails), only re-asking about jobs that aren't finished yet.
+# Writes job_states.tsv next to benchmark.csv after every round — state, exit code,
+# elapsed, MaxRSS (max over job steps), node — and returns as soon as every job is in a
+# terminal state. Array tasks (<array>_<task>) and --pack bundles (many run_ids, one job
+# id) are handled.
+#
+# Exit status: 0 all COMPLETED, 1 some terminal but not COMPLETED, 2 still open at
+# --timeout (or after --once).
+#
+# Testing without SLURM: point --sacct-bin (or $SACCT_BIN) at a stub, or --record a real
+# session's sacct output to a JSON-lines file and --replay it later (one recorded call
+# per sacct call, in order; the last recording repeats once exhausted).
+#
+# Usage:
+#   python job_tracker.py <run_dir> [--interval 60] [--min-gap 2] [--timeout 12h]
+#       [--once] [--sacct-bin sacct] [--record sacct.jsonl | --replay sacct.jsonl]
+
+import argparse
+import csv
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+FIELDS = ["JobID", "State", "ExitCode", "Elapsed", "MaxRSS", "NodeList", "Start", "End"]
+TERMINAL = {"COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL",
+            "PREEMPTED", "BOOT_FAIL", "DEADLINE", "REVOKED", "SPECIAL_EXIT"}
+SKIP_IDS = {"", "DRY_RUN", "ERROR", "LOCAL"}
+BATCH_SIZE = 200          # job ids per sacct call (keeps argv and slurmdbd queries small)
+MAX_BACKOFF = 600
+OUT_COLUMNS = ["run_id", "job_id", "state", "exit_code", "elapsed_s", "max_rss_kb", "node",
+               "start", "end", "polls"]
+
+
+def elapsed_to_s(text):
+    """sacct Elapsed '[D-]HH:MM:SS' -> seconds."""
+    if not text:
+        return None
+    days = 0
+    if "-" in text:
+        d, text = text.split("-", 1)
+        days = int(d)
+    secs = 0
+    for part in text.split(":"):
+        secs = secs * 60 + float(part)
+    return days * 86400 + secs
+
+
+def rss_to_kb(text):
+    """sacct MaxRSS '123456K' / '1.5G' / '' -> KB."""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([KMGT]?)", text or "")
+    if not m:
+        return None
+    return float(m.group(1)) * {"": 1 / 1024, "K": 1, "M": 1024, "G": 1024 ** 2,
+                                "T": 1024 ** 3}[m.group(2)]
+
+
+def _expand_array(job_id):
+    """'123_[4-6,9%20]' -> ['123_4', '123_5', '123_6', '123_9'] (pending array tasks
+    are printed collapsed); anything else comes back as [job_id]."""
+    m = re.fullmatch(r"(\d+)_\[([^\]]+)\]", job_id)
+    if not m:
+        return [job_id]
+    out = []
+    for part in m.group(2).split("%")[0].split(","):
+        lo, _, hi = part.partition("-")
+        out += [f"{m.group(1)}_{i}" for i in range(int(lo), int(hi or lo) + 1)]
+    return out
+
+
+def parse_sacct(text):
+    """job id -> {state, exit_code, elapsed_s, max_rss_kb, node, start, end} from
+    `sacct -P -n` output. The allocation line gives state / exit code / times; MaxRSS
+    only appears on steps (<id>.batch, <id>.0, …), so it is the max over them."""
+    jobs = {}
+    for line in text.splitlines():
+        f = line.split("|")
+        if len(f) < len(FIELDS):
+            continue
+        rec = dict(zip(FIELDS, f))
+        jid, _, step = rec["JobID"].partition(".")
+        for j in _expand_array(jid):
+            job = jobs.setdefault(j, {"state": "", "exit_code": "", "elapsed_s": None,
+                                      "max_rss_kb": None, "node": "", "start": "", "end": ""})
+            rss = rss_to_kb(rec["MaxRSS"])
+            if rss is not None:
+                job["max_rss_kb"] = max(job["max_rss_kb"] or 0, rss)
+            if step:
+                continue
+            job.update({"state": rec["State"].split()[0] if rec["State"] else "",
+                        "exit_code": rec["ExitCode"], "elapsed_s": elapsed_to_s(rec["Elapsed"]),
+                        "node": rec["NodeList"], "start": rec["Start"], "end": rec["End"]})
+    return jobs
+
+
+class Sacct:
+    """Batched, rate-limited sacct caller with optional record / replay."""
+
+    def __init__(self, sacct_bin, min_gap, record=None, replay=None):
+        self.sacct_bin, self.min_gap = sacct_bin, min_gap
+        self.record = open(record, "a") if record else None
+        self.replay = [json.loads(l) for l in Path(replay).read_text().splitlines() if l] \
+            if replay else None
+        self.last_call = 0.0
+        self.n_calls = 0
+
+    def _call(self, ids):
+        args = [self.sacct_bin, "-P", "-n", "--format=" + ",".join(FIELDS), "-j", ",".join(ids)]
+        if self.replay is not None:
+            if not self.replay:
+                raise RuntimeError("replay file is empty")
+            entry = self.replay[min(self.n_calls, len(self.replay) - 1)]
+            self.n_calls += 1
+            return entry["stdout"]
+        wait = self.min_gap - (time.monotonic() - self.last_call)
+        if wait > 0:
+            time.sleep(wait)
+        self.last_call = time.monotonic()
+        self.n_calls += 1
+        r = subprocess.run(args, capture_output=True, text=True, check=False)
+        if r.returncode != 0:
+            raise RuntimeError(f"sacct exit {r.returncode}: {r.stderr.strip()[:200]}")
+        if self.record:
+            self.record.write(json.dumps({"args": args, "stdout": r.stdout}) + "\n")
+            self.record.flush()
+        return r.stdout
+
+    def query(self, ids):
+        out = {}
+        for start in range(0, len(ids), BATCH_SIZE):
+            out.update(parse_sacct(self._call(ids[start:start + BATCH_SIZE])))
+        return out
+
+
+def read_submitted(run_dir):
+    path = Path(run_dir) / "submitted.tsv"
+    if not path.exists():
+        raise SystemExit(f"ERROR: {path} not found — nothing submitted from this run dir")
+    with path.open(newline="") as f:
+        return [(r["run_id"], r["job_id"]) for r in csv.DictReader(f, delimiter="\t")
+                if r["job_id"] not in SKIP_IDS]
+
+
+def write_states(path, runs, states, polls):
+    tmp = Path(f"{path}.tmp.{os.getpid()}")
+    with tmp.open("w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(OUT_COLUMNS)
+        for run_id, jid in runs:
+            s = states.get(jid, {})
+            w.writerow([run_id, jid, s.get("state") or "UNKNOWN", s.get("exit_code", ""),
+                        "" if s.get("elapsed_s") is None else f"{s['elapsed_s']:.0f}",
+                        "" if s.get("max_rss_kb") is None else f"{s['max_rss_kb']:.0f}",
+                        s.get("node", ""), s.get("start", ""), s.get("end", ""), polls.get(jid, 0)])
+    os.replace(tmp, path)
+
+
+def parse_duration(text):
+    if not text:
+        return None
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd]?)", text)
+    if not m:
+        raise SystemExit(f"ERROR: bad duration {text!r} (e.g. 90m, 12h)")
+    return float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[m.group(2)]
+
+
+def track(run_dir, sacct, interval, timeout=None, once=False):
+    runs = read_submitted(run_dir)
+    out_path = Path(run_dir) / "job_states.tsv"
+    jobs = list(dict.fromkeys(jid for _, jid in runs))
+    states, polls = {}, {}
+    t0 = time.monotonic()
+    backoff = interval
+    print(f"[track] {len(runs)} runs in {len(jobs)} jobs -> {out_path}", flush=True)
+    while True:
+        open_ids = [j for j in jobs if states.get(j, {}).get("state") not in TERMINAL]
+        try:
+            got = sacct.query(open_ids) if open_ids else {}
+            backoff = interval
+        except (RuntimeError, OSError) as e:
+            backoff = min(backoff * 2, MAX_BACKOFF)
+            print(f"WARNING: {e}; retrying in {backoff:.0f}s", file=sys.stderr, flush=True)
+            got = None
+        if got is not None:
+            for j in open_ids:
+                polls[j] = polls.get(j, 0) + 1
+                if j in got:
+                    states[j] = got[j]
+            write_states(out_path, runs, states, polls)
+            counts = {}
+            for j in jobs:
+                st = states.get(j, {}).get("state") or "UNKNOWN"
+                counts[st] = counts.get(st, 0) + 1
+            n_open = sum(v for k, v in counts.items() if k not in TERMINAL)
+            print(f"[track] {time.strftime('%H:%M:%S')} "
+                  + " ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+                  + f"  ({n_open} open, {sacct.n_calls} sacct calls)", flush=True)
+            if not n_open:
+                bad = [j for j in jobs if states[j]["state"] != "COMPLETED"]
+                print(f"[track] all terminal; {len(jobs) - len(bad)} COMPLETED, {len(bad)} not",
+                      flush=True)
+                return 1 if bad else 0
+        if once:
+            return 2
+        if timeout and time.monotonic() - t0 + backoff > timeout:
+            print(f"[track] timeout with jobs still open; see {out_path}", file=sys.stderr)
+            return 2
+        time.sleep(backoff)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("run_dir", help="Stage directory holding submitted.tsv")
+    p.add_argument("--interval", type=float, default=60, help="Seconds between polling rounds")
+    p.add_argument("--min-gap", type=float, default=2,
+                   help="Minimum seconds between consecutive sacct calls (slurmdbd courtesy)")
+    p.add_argument("--timeout", default=None, help="Give up after this long (e.g. 12h)")
+    p.add_argument("--once", action="store_true", help="One round, write job_states.tsv, exit")
+    p.add_argument("--sacct-bin", default=os.environ.get("SACCT_BIN", "sacct"))
+    g = p.add_mutually_exclusive_group()
+    g.add_argument("--record", default=None, help="Append every sacct call's output here (JSON lines)")
+    g.add_argument("--replay", default=None, help="Answer sacct calls from a --record file")
+    args = p.parse_args()
+
+    sacct = Sacct(args.sacct_bin, args.min_gap, args.record, args.replay)
+    sys.exit(track(args.run_dir, sacct, args.interval, parse_duration(args.timeout), args.once))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Page-cache control for the runners, so cold/warm-cache conditions no longer
+# need a whole --exclusive node. `cold` flushes and drops the input (plus index siblings
+# and leftover files in the tmp dir) from the page cache with posix_fadvise(DONTNEED);
+# `warm` reads them through once. Either way the residency actually achieved is measured
+# with mincore(2) and printed, so each benchmark row records the cache state it ran in
+# rather than the one that was asked for. Stdlib only (ctypes for mincore).
+#
+# Usage:
+#   python page_cache.py prepare --state cold|warm|none --input <file> [--tmp-dir <dir>] [--row]
+#   python page_cache.py residency <file> [<file> ...]
+
+import argparse
+import ctypes
+import ctypes.util
+import mmap
+import os
+import sys
+
+INDEX_SUFFIXES = (".bai", ".csi", ".crai", ".tbi", ".fai", ".gzi")
+WINDOW = 1 << 30            # mincore in 1 GiB windows: vector memory stays ~256 KB
+READ_BLOCK = 8 << 20
+
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+                       ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+MAP_FAILED = ctypes.c_void_p(-1).value
+_LOW_BIT = bytes(b & 1 for b in range(256))
+
+
+def residency(path):
+    """(resident_pages, total_pages) for a file, via mmap + mincore. Maps the file
+    without touching it, so measuring doesn't change what it measures."""
+    page = mmap.PAGESIZE
+    size = os.path.getsize(path)
+    total = (size + page - 1) // page
+    if size == 0:
+        return 0, 0
+    resident = 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for off in range(0, size, WINDOW):
+            length = min(WINDOW, size - off)
+            addr = _libc.mmap(None, length, mmap.PROT_READ, mmap.MAP_SHARED, fd, off)
+            if addr in (None, MAP_FAILED):
+                raise OSError(ctypes.get_errno(), f"mmap failed for {path}")
+            try:
+                n = (length + page - 1) // page
+                vec = (ctypes.c_ubyte * n)()
+                if _libc.mincore(ctypes.c_void_p(addr), length, vec) != 0:
+                    raise OSError(ctypes.get_errno(), f"mincore failed for {path}")
+                resident += bytes(vec).translate(_LOW_BIT).count(1)   # bit 0 = resident
+            finally:
+                _libc.munmap(ctypes.c_void_p(addr), length)
+    finally:
+        os.close(fd)
+    return resident, total
+
+
+def evict(path):
+    """Write back dirty pages, then ask the kernel to drop the file's cached pages.
+    Pages mapped by another process (e.g. a concurrent job reading the same input)
+    stay resident — which is exactly why residency is measured afterwards."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def warm(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while os.read(fd, READ_BLOCK):
+            pass
+    finally:
+        os.close(fd)
+
+
+def targets(input_path, tmp_dir=None):
+    """The input, its index siblings, and regular files directly in tmp_dir."""
+    out = [input_path]
+    out += [input_path + s for s in INDEX_SUFFIXES if os.path.isfile(input_path + s)]
+    if tmp_dir and os.path.isdir(tmp_dir):
+        out += [e.path for e in os.scandir(tmp_dir) if e.is_file(follow_symlinks=False)]
+    return out
+
+
+def prepare(state, input_path, tmp_dir=None):
+    """Apply the cache state; return (the input's resident fraction right after, whether
+    the input itself was prepared). Failures on index / tmp files only warn."""
+    input_ok = True
+    if state != "none":
+        for path in targets(input_path, tmp_dir):
+            try:
+                if state == "cold":
+                    evict(path)
+                else:
+                    warm(path)
+            except OSError as e:
+                print(f"WARNING: {state} {path}: {e}", file=sys.stderr)
+                input_ok = input_ok and path != input_path
+    res, tot = residency(input_path)
+    return (res / tot if tot else 0.0), input_ok
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+    pr = sub.add_parser("prepare", help="Make the input cold / warm, then report residency")
+    pr.add_argument("--state", choices=["cold", "warm", "none"], required=True)
+    pr.add_argument("--input", required=True)
+    pr.add_argument("--tmp-dir", default=None)
+    pr.add_argument("--row", action="store_true",
+                    help="Print only the resident fraction (for the benchmark row)")
+    rs = sub.add_parser("residency", help="Resident fraction of each file")
+    rs.add_argument("paths", nargs="+")
+    args = p.parse_args()
+
+    if args.cmd == "prepare":
+        try:
+            frac, input_ok = prepare(args.state, args.input, args.tmp_dir)
+        except OSError as e:
+            raise SystemExit(f"ERROR: residency of {args.input}: {e}")
+        print(f"{frac:.4f}" if args.row else f"{args.input}: {args.state}, {frac:.1%} resident")
+        if not input_ok:
+            sys.exit(1)     # the runner records cache_state=<state>_failed
+        return
+    for path in args.paths:
+        res, tot = residency(path)
+        print(f"{path}\t{res}/{tot} pages\t{res / tot if tot else 0:.1%}")
+
+
+if __name__ == "__main__":
+    main()
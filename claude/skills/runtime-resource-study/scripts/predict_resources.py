@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Consume model.yaml (from fit_model.py) and a sample sheet; emit per-sample
+# predicted wall, peak RSS and safety-quantile SLURM / Snakemake resources. Record
+# counts come from the cheapest available source, in order:
+#   1. a primary_records / n_records column in the sample sheet
+#   2. the BAM .bai index (per-reference mapped + unmapped counts; no reads decoded)
+#   3. `samtools idxstats` for .csi / CRAM indexes, if samtools is on PATH
+#   4. file size / bytes-per-record (from --bytes-per-record or model.yaml validation)
+# Samples are resolved in parallel with a thread pool (index reads are I/O bound).
+#
+# Usage:
+#   python predict_resources.py --model model.yaml --samples sample_sheet.tsv \
+#       [--threads 16] [--quantile 0.95] [--format tsv|snakemake] --output resources.tsv
+
+import argparse
+import csv
+import math
+import os
+import shutil
+import struct
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import median
+
+import yaml
+
+BAI_META_BIN = 37450     # pseudo-bin holding (n_mapped, n_unmapped) per reference
+DEFAULT_MARGIN = 1.3     # same padding as the model.yaml.template helper_function
+
+
+def bai_record_count(bai_path):
+    """Total records (mapped + unmapped, incl. no-coordinate) from a BAI index.
+    Counts secondary/supplementary alignments like `samtools idxstats` does."""
+    buf = Path(bai_path).read_bytes()
+    if buf[:4] != b"BAI\x01":
+        raise ValueError(f"not a BAI index: {bai_path}")
+    off = 4
+    (n_ref,) = struct.unpack_from("<i", buf, off); off += 4
+    total = 0
+    for _ in range(n_ref):
+        (n_bin,) = struct.unpack_from("<i", buf, off); off += 4
+        for _ in range(n_bin):
+            bin_id, n_chunk = struct.unpack_from("<Ii", buf, off); off += 8
+            if bin_id == BAI_META_BIN and n_chunk == 2:
+                n_mapped, n_unmapped = struct.unpack_from("<QQ", buf, off + 16)
+                total += n_mapped + n_unmapped
+            off += 16 * n_chunk
+        (n_intv,) = struct.unpack_from("<i", buf, off); off += 4 + 8 * n_intv
+    if off + 8 <= len(buf):
+        total += struct.unpack_from("<Q", buf, off)[0]
+    return total
+
+
+def idxstats_record_count(path):
+    r = subprocess.run(["samtools", "idxstats", str(path)], capture_output=True,
+                       text=True, check=True)
+    return sum(int(f[2]) + int(f[3]) for f in (l.split("\t") for l in r.stdout.splitlines()) if len(f) >= 4)
+
+
+def find_index(path):
+    for ext in (".bai", ".csi", ".crai"):
+        for cand in (Path(str(path) + ext), Path(path).with_suffix(ext)):
+            if cand.exists():
+                return cand
+    return None
+
+
+def count_records(row, bytes_per_record):
+    """Return (n_records, file_size_bytes, source) for one sample-sheet row.
+    file_size_bytes is None when the input file is missing or unreadable."""
+    path = row.get("path", "")
+    try:
+        size = os.path.getsize(path) if path else None
+    except OSError:
+        size = None
+    for col in ("primary_records", "n_records"):
+        text = row.get(col, "").strip()
+        if not text:
+            continue
+        try:
+            n = float(text)
+        except ValueError:
+            n = math.nan
+        if math.isfinite(n) and n >= 0:
+            return n, size, "sample_sheet"
+        print(f"WARNING: sample {row.get('sample', '?')}: {col}={text!r} is not a record "
+              f"count; falling back to the index / file size", file=sys.stderr)
+    idx = find_index(path) if path else None
+    if idx is not None:
+        try:
+            if idx.suffix == ".bai":
+                return float(bai_record_count(idx)), size, "bai"
+            if shutil.which("samtools"):
+                return float(idxstats_record_count(path)), size, "idxstats"
+        except (ValueError, struct.error, subprocess.CalledProcessError, OSError):
+            pass
+    if size and bytes_per_record:
+        return size / bytes_per_record, size, "file_size"
+    return None, size, "missing"
+
+
+def bytes_per_record_from_model(model):
+    obs = (model.get("validation") or {}).get("observations") or []
+    ratios = [o["file_size_bytes"] / o["n_primary"] for o in obs
+              if o.get("n_primary") and o.get("file_size_bytes")]
+    return median(ratios) if ratios else None
+
+
+def _base_wall(m, n):
+    """Wall at the calibration thread count for one model section. wall_model_cv
+    carries fit_model.py's CV winner, whose form depends on `winner` (same
+    formulas as fit_model.predict_candidate)."""
+    winner = m.get("winner")
+    if winner == "power_law":
+        return m["a_seconds"] * max(n, 0.0) ** m["k_exponent"]
+    if winner == "n_log_n":
+        return m["a_seconds"] + m["b_us_per_record_log2"] * 1e-6 * n * math.log2(max(n, 2.0))
+    return m["a_seconds"] + m["b_us_per_record"] * 1e-6 * n
+
+
+def spill_penalty(model, n, mem_gb=None):
+    """Extra wall seconds (calibration threads) for a run past the RSS breakpoint whose
+    memory request is below the in-memory line, i.e. one that will spill:
+    c * (n - breakpoint_N) from rss_model_piecewise.spill_wall_penalty. mem_gb=None
+    (request unknown) assumes it spills."""
+    pw = model.get("rss_model_piecewise") or {}
+    pen = pw.get("spill_wall_penalty")
+    if not (pw.get("breakpoint_detected") and pen) or n <= pw["breakpoint_N"]:
+        return 0.0
+    if mem_gb is not None and mem_gb >= predict_rss(model, n)[1]:
+        return 0.0
+    return max(pen["c_us_per_record_past_breakpoint"], 0.0) * 1e-6 * (n - pw["breakpoint_N"])
+
+
+def predict_wall(model, name, n, size_bytes, threads, bytes_per_record=None, mem_gb=None):
+    """Wall seconds for n records at `threads` (floored at 5 s). wall_model_v2 needs the
+    input size: when it is unknown (None) it is estimated as n * bytes_per_record, and
+    without that ratio the prediction falls back to wall_model_v1 — never to 0 bytes.
+    mem_gb is the memory request; below the in-memory line past the breakpoint the
+    spill penalty is added."""
+    if name == "wall_model_v2" and size_bytes is None and bytes_per_record:
+        size_bytes = n * bytes_per_record
+    if name == "wall_model_v2" and size_bytes is None:
+        name = "wall_model_v1"
+    m = model[name]
+    wall = _base_wall(m, n)
+    if name == "wall_model_v2":
+        wall += m["c_seconds_per_GB"] * size_bytes / 1024 ** 3
+    wall += spill_penalty(model, n, mem_gb)
+    joint = model.get("joint_wall_model")
+    ts = model.get("thread_scaling")
+    if threads and joint and ts:
+        g = ts["serial_fraction"] + ts["parallel_fraction"] / threads + ts["contention"] * (threads - 1)
+        wall *= g / joint["g_threads_calib"]
+    return max(wall, 5.0)
+
+
+def predict_rss(model, n):
+    """Peak RSS in GB. Uses the piecewise model when a spill breakpoint was detected;
+    also returns the in-memory-line RSS, i.e. what it takes to avoid spilling."""
+    pw = model.get("rss_model_piecewise")
+    if pw and pw.get("breakpoint_detected"):
+        in_mem = pw["a_mem_GB"] + pw["b_mem_bytes_per_record"] * n / 1024 ** 3
+        if n < pw["breakpoint_N"]:
+            return in_mem, in_mem
+        return pw["a_spill_GB"] + pw["b_spill_bytes_per_record"] * n / 1024 ** 3, in_mem
+    lin = model["rss_model"]
+    rss = lin["a_GB"] + lin["b_bytes_per_record"] * n / 1024 ** 3
+    if lin.get("saturation_cap_GB"):
+        rss = min(rss, lin["saturation_cap_GB"])
+    return rss, rss
+
+
+def safety_ratio(model, key, quantile, wall_model=None):
+    """Calibration obs/pred ratio at quantile. A wall model section with its own
+    quantiles (wall_model_cv) overrides prediction_intervals, which describe v1/v2."""
+    qd = ((model.get(wall_model) or {}).get(key) if wall_model else None) \
+        or (model.get("prediction_intervals") or {}).get(key) or {}
+    return qd.get(f"q{int(round(quantile * 100))}", DEFAULT_MARGIN)
+
+
+def predict_sample(row, model, wall_model, threads, quantile, bytes_per_record):
+    n, size, source = count_records(row, bytes_per_record)
+    out = {"sample": row.get("sample", ""), "path": row.get("path", ""),
+           "n_records": "", "n_source": source, "file_size_bytes": size}
+    if n is None:
+        return out
+    rss, rss_no_spill = predict_rss(model, n)
+    rss_q = max(rss, 0.1) * safety_ratio(model, "rss_ratio", quantile)
+    wall = predict_wall(model, wall_model, n, size, threads, bytes_per_record, mem_gb=rss_q)
+    wall_q = wall * safety_ratio(model, "wall_ratio", quantile, wall_model)
+    out.update({
+        "n_records": int(n),
+        "threads": threads,
+        "wall_pred_s": round(wall, 1),
+        "wall_q_s": round(wall_q, 1),
+        "rss_pred_GB": round(rss, 3),
+        "rss_q_GB": round(rss_q, 3),
+        "rss_no_spill_GB": round(rss_no_spill, 3),
+        "mem_mb": int(rss_q * 1024) + 1,
+        "runtime": max(1, int(wall_q / 60) + 1),     # minutes, as Snakemake expects
+    })
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", required=True, help="model.yaml from fit_model.py")
+    p.add_argument("--samples", required=True,
+                   help="Sample sheet (TSV/CSV) with 'sample' and 'path' columns")
+    p.add_argument("--output", default="resources.tsv")
+    p.add_argument("--format", choices=["tsv", "snakemake"], default="tsv",
+                   help="tsv table, or a Snakemake-loadable YAML keyed by sample")
+    p.add_argument("--threads", type=int, default=None,
+                   help="Thread count to predict for (default: recommended or calibrated)")
+    p.add_argument("--wall-model", default=None,
+                   help="wall_model_v1 | wall_model_v2 | wall_model_cv (default: recommended_model)")
+    p.add_argument("--quantile", type=float, default=0.95,
+                   help="Safety quantile from prediction_intervals (default: 0.95)")
+    p.add_argument("--bytes-per-record", type=float, default=None,
+                   help="File-size fallback ratio (default: from model.yaml validation)")
+    p.add_argument("--jobs", type=int, default=32, help="Parallel sample resolvers")
+    args = p.parse_args()
+
+    model = yaml.safe_load(Path(args.model).read_text())
+    wall_model = args.wall_model or model.get("recommended_model", "wall_model_v1")
+    if wall_model not in model:
+        print(f"ERROR: {wall_model} not in {args.model}", file=sys.stderr)
+        sys.exit(1)
+    joint = model.get("joint_wall_model") or {}
+    threads = args.threads or joint.get("recommended_threads") or joint.get("threads_calib")
+    bpr = args.bytes_per_record or bytes_per_record_from_model(model)
+
+    delim = "," if args.samples.endswith(".csv") else "\t"
+    with open(args.samples) as f:
+        samples = list(csv.DictReader(f, delimiter=delim))
+    print(f"Loaded {len(samples)} samples from {args.samples}")
+    print(f"Wall model: {wall_model}   threads: {threads or 'calibrated'}   quantile: {args.quantile}")
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as ex:
+        preds = list(ex.map(lambda r: predict_sample(r, model, wall_model, threads,
+                                                     args.quantile, bpr), samples))
+
+    missing = [r["sample"] for r in preds if r["n_source"] == "missing"]
+    no_size = [r["sample"] for r in preds
+               if r["n_source"] != "missing" and r["file_size_bytes"] is None]
+    if no_size and wall_model == "wall_model_v2":
+        print(f"WARNING: input file missing or unreadable for {len(no_size)} samples; "
+              f"wall_model_v2 uses " + ("N × bytes_per_record" if bpr else "wall_model_v1")
+              + f" for them: {', '.join(no_size[:10])}", file=sys.stderr)
+    if missing:
+        print(f"WARNING: no record count for {len(missing)} samples "
+              f"(no index, no size fallback): {', '.join(missing[:10])}", file=sys.stderr)
+    by_source = {}
+    for r in preds:
+        by_source[r["n_source"]] = by_source.get(r["n_source"], 0) + 1
+    print("Record-count sources: " + ", ".join(f"{k}={v}" for k, v in sorted(by_source.items())))
+
+    if args.format == "snakemake":
+        # threads only when one was chosen: a null would override the rule's own threads
+        out = {"resources": {r["sample"]: {**({"threads": r["threads"]} if r["threads"] else {}),
+                                           "mem_mb": r["mem_mb"], "runtime": r["runtime"]}
+                             for r in preds if r["n_source"] != "missing"}}
+        Path(args.output).write_text(
+            f"# Per-sample resources from {args.model} (q{int(round(args.quantile * 100))})\n"
+            "# In the Snakefile: resources: mem_mb=lambda wc: config['resources'][wc.sample]['mem_mb']\n"
+            + yaml.safe_dump(out, sort_keys=False))
+    else:
+        keys = ["sample", "path", "n_records", "n_source", "file_size_bytes", "threads",
+                "wall_pred_s", "wall_q_s", "rss_pred_GB", "rss_q_GB", "rss_no_spill_GB",
+                "mem_mb", "runtime"]
+        with open(args.output, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=keys, delimiter="\t")
+            w.writeheader()
+            for r in preds:
+                w.writerow({k: r.get(k, "") for k in keys})
+    print(f"\nSaved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: /proc time-series sidecar for 03_run_one. GNU time -v only reports end-of-run
+# totals; this samples the whole process tree under a pid (RSS, cumulative CPU seconds,
+# read/write bytes from /proc/<pid>/{statm,stat,io}) at a fixed interval into a compact
+# binary trace, then segments the trace into phases (cpu / read / write / wait) so the
+# benchmark row can say *when* a run spilled or saturated I/O, not just how much.
+# Stdlib only — it runs inside the tool's environment on the compute node.
+#
+# Usage:
+#   python proc_sampler.py record  --pid <pid> --out run.trace [--interval 0.5]
+#   python proc_sampler.py summary run.trace [--threads N] [--row] [--phases-tsv out.tsv]
+#
+# Trace format: 8-byte magic "PSTRACE1", then one little-endian record per sample:
+#   t_s (f8), rss_kb (u8), cpu_s (f8), read_bytes (u8), write_bytes (u8), n_proc (u4)
+# cpu_s / read_bytes / write_bytes are cumulative over every process ever seen in the
+# tree, so they stay monotonic when children exit.
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+MAGIC = b"PSTRACE1"
+RECORD = struct.Struct("<dQdQQI")
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_KB = (os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096) // 1024
+
+# Phase labelling: a sample is "cpu" / "read" / "write" when that resource's rate is at
+# least ACTIVE_FRAC of its run maximum (and the strongest of the three); otherwise "wait".
+# Runs shorter than MIN_PHASE_FRAC of the wall (or MIN_PHASE_SAMPLES) merge into neighbours.
+ACTIVE_FRAC = 0.25
+MIN_PHASE_FRAC = 0.05
+MIN_PHASE_SAMPLES = 3
+
+ROW_FIELDS = ["trace_samples", "n_phases", "phase_seq", "peak_rss_phase", "t_peak_rss_s",
+              "peak_read_mbps", "peak_write_mbps", "read_gb", "write_gb"]
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+def _children_map():
+    """ppid -> [pid] for every process, from one pass over /proc/<pid>/stat."""
+    kids = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm may contain spaces / parens; fields resume after the last ')'
+        ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        kids.setdefault(ppid, []).append(int(name))
+    return kids
+
+
+def _tree(root):
+    kids = _children_map()
+    out, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        out.append(pid)
+        stack.extend(kids.get(pid, ()))
+    return out
+
+
+def _sample_pid(pid):
+    """(rss_kb, cpu_s, read_bytes, write_bytes) or None if the process is gone."""
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            rss_kb = int(f.read().split()[1]) * PAGE_KB
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        fields = stat[stat.rindex(b")") + 2:].split()
+        cpu_s = (int(fields[11]) + int(fields[12])) / CLK_TCK    # utime + stime
+    except (OSError, ValueError, IndexError):
+        return None
+    rb = wb = 0
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    rb = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    wb = int(line.split()[1])
+    except OSError:
+        pass    # /proc/<pid>/io needs same uid / ptrace access; leave I/O at 0
+    return rss_kb, cpu_s, rb, wb
+
+
+def record(pid, out, interval):
+    """Sample until pid exits. Each record is flushed so a killed job still leaves a
+    readable trace up to the kill."""
+    last = {}       # pid -> (cpu_s, rb, wb) last seen, so exited children keep counting
+    t0 = time.monotonic()
+    with open(out, "wb") as f:
+        f.write(MAGIC)
+        while os.path.exists(f"/proc/{pid}"):
+            rss = 0
+            live = 0
+            for p in _tree(pid):
+                s = _sample_pid(p)
+                if s is None:
+                    continue
+                live += 1
+                rss += s[0]
+                last[p] = s[1:]
+            cpu = sum(v[0] for v in last.values())
+            rb = sum(v[1] for v in last.values())
+            wb = sum(v[2] for v in last.values())
+            f.write(RECORD.pack(time.monotonic() - t0, rss, cpu, rb, wb, live))
+            f.flush()
+            time.sleep(interval)
+
+
+def read_trace(path):
+    """List of (t_s, rss_kb, cpu_s, read_bytes, write_bytes, n_proc) tuples."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise SystemExit(f"ERROR: {path} is not a proc_sampler trace")
+    body = data[len(MAGIC):]
+    n = len(body) // RECORD.size    # a torn last record (killed mid-write) is dropped
+    return [RECORD.unpack_from(body, i * RECORD.size) for i in range(n)]
+
+
+# ---------------------------------------------------------------------------
+# Phase summary
+# ---------------------------------------------------------------------------
+def _rates(samples):
+    """Per-interval (t_mid, dt, cpu_cores, read_Bps, write_Bps, rss_kb)."""
+    out = []
+    for a, b in zip(samples, samples[1:]):
+        dt = b[0] - a[0]
+        if dt <= 0:
+            continue
+        out.append(((a[0] + b[0]) / 2, dt, (b[2] - a[2]) / dt,
+                    max(0, b[3] - a[3]) / dt, max(0, b[4] - a[4]) / dt, b[1]))
+    return out
+
+
+def _label(rates, threads):
+    # CPU is judged against the cores the run was given when known, so a 1-core wait
+    # on an 8-thread run doesn't count as a compute phase.
+    cpu_ref = threads if threads else max((r[2] for r in rates), default=0)
+    rd_ref = max((r[3] for r in rates), default=0)
+    wr_ref = max((r[4] for r in rates), default=0)
+    labels = []
+    for r in rates:
+        scores = {"cpu": r[2] / cpu_ref if cpu_ref else 0,
+                  "read": r[3] / rd_ref if rd_ref else 0,
+                  "write": r[4] / wr_ref if wr_ref else 0}
+        best = max(scores, key=scores.get)
+        labels.append(best if scores[best] >= ACTIVE_FRAC else "wait")
+    return labels
+
+
+def _segments(labels, durations, min_dur):
+    """Run-length encode labels, then absorb short runs into the longer neighbour."""
+    segs = []
+    for i, lab in enumerate(labels):
+        if segs and segs[-1][0] == lab:
+            segs[-1][2] = i + 1
+        else:
+            segs.append([lab, i, i + 1])
+    changed = True
+    while changed and len(segs) > 1:
+        changed = False
+        for k, (lab, s, e) in enumerate(segs):
+            dur = sum(durations[s:e])
+            if dur >= min_dur and e - s >= MIN_PHASE_SAMPLES:
+                continue
+            left = segs[k - 1] if k > 0 else None
+            right = segs[k + 1] if k + 1 < len(segs) else None
+            into = max((x for x in (left, right) if x),
+                       key=lambda x: sum(durations[x[1]:x[2]]))
+            into[1], into[2] = min(into[1], s), max(into[2], e)
+            del segs[k]
+            # re-merge neighbours that now share a label
+            merged = []
+            for seg in segs:
+                if merged and merged[-1][0] == seg[0]:
+                    merged[-1][2] = seg[2]
+                else:
+                    merged.append(seg)
+            segs[:] = merged
+            changed = True
+            break
+    return segs
+
+
+def phases(samples, threads=None):
+    """List of phase dicts: label, start_s, end_s, dur_s, peak_rss_kb, mean_cpu_cores,
+    read_bytes, write_bytes."""
+    rates = _rates(samples)
+    if not rates:
+        return []
+    labels = _label(rates, threads)
+    durations = [r[1] for r in rates]
+    wall = samples[-1][0] - samples[0][0]
+    out = []
+    for lab, s, e in _segments(labels, durations, MIN_PHASE_FRAC * wall):
+        part = rates[s:e]
+        dur = sum(r[1] for r in part)
+        out.append({
+            "label": lab,
+            "start_s": part[0][0] - part[0][1] / 2,
+            "end_s": part[-1][0] + part[-1][1] / 2,
+            "dur_s": dur,
+            "peak_rss_kb": max(r[5] for r in part),
+            "mean_cpu_cores": sum(r[2] * r[1] for r in part) / dur,
+            "read_bytes": int(sum(r[3] * r[1] for r in part)),
+            "write_bytes": int(sum(r[4] * r[1] for r in part)),
+        })
+    return out
+
+
+def summarise(samples, threads=None):
+    """Benchmark-row fields (ROW_FIELDS). phase_seq is '>'-joined so it stays one CSV cell."""
+    ph = phases(samples, threads)
+    if not ph:
+        return {**{k: "NA" for k in ROW_FIELDS}, "trace_samples": len(samples)}
+    peak = max(samples, key=lambda s: s[1])
+    peak_phase = next((p["label"] for p in ph if p["start_s"] <= peak[0] <= p["end_s"]),
+                      ph[-1]["label"])
+    rates = _rates(samples)
+    return {
+        "trace_samples": len(samples),
+        "n_phases": len(ph),
+        "phase_seq": ">".join(p["label"] for p in ph),
+        "peak_rss_phase": peak_phase,
+        "t_peak_rss_s": f"{peak[0]:.1f}",
+        "peak_read_mbps": f"{max(r[3] for r in rates) / 1e6:.1f}",
+        "peak_write_mbps": f"{max(r[4] for r in rates) / 1e6:.1f}",
+        "read_gb": f"{samples[-1][3] / 1e9:.3f}",
+        "write_gb": f"{samples[-1][4] / 1e9:.3f}",
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("record", help="Sample a process tree until it exits")
+    r.add_argument("--pid", type=int, required=True)
+    r.add_argument("--out", required=True)
+    r.add_argument("--interval", type=float, default=0.5, help="Seconds between samples")
+    s = sub.add_parser("summary", help="Phase summary of a trace")
+    s.add_argument("trace")
+    s.add_argument("--threads", type=float, default=None,
+                   help="Cores given to the run (CPU phases are judged against this)")
+    s.add_argument("--row", action="store_true",
+                   help="Print a CSV header line and value line for the benchmark record")
+    s.add_argument("--phases-tsv", default=None, help="Also write the per-phase table")
+    args = p.parse_args()
+
+    if args.cmd == "record":
+        record(args.pid, args.out, args.interval)
+        return
+
+    samples = read_trace(args.trace)
+    if args.phases_tsv:
+        with open(args.phases_tsv, "w") as f:
+            cols = ["label", "start_s", "end_s", "dur_s", "peak_rss_kb", "mean_cpu_cores",
+                    "read_bytes", "write_bytes"]
+            f.write("\t".join(cols) + "\n")
+            for ph in phases(samples, args.threads):
+                f.write("\t".join(f"{ph[c]:.2f}" if isinstance(ph[c], float) else str(ph[c])
+                                  for c in cols) + "\n")
+    summary = summarise(samples, args.threads)
+    if args.row:
+        print(",".join(ROW_FIELDS))
+        print(",".join(str(summary[k]) for k in ROW_FIELDS))
+        return
+    print(f"{args.trace}: {len(samples)} samples")
+    for ph in phases(samples, args.threads):
+        print(f"  {ph['label']:<6} {ph['start_s']:8.1f}–{ph['end_s']:8.1f}s  "
+              f"rss≤{ph['peak_rss_kb'] / 1048576:6.2f} GB  cpu {ph['mean_cpu_cores']:5.2f}  "
+              f"r {ph['read_bytes'] / 1e9:7.3f} GB  w {ph['write_bytes'] / 1e9:7.3f} GB")
+    for k in ROW_FIELDS:
+        print(f"  {k}: {summary[k]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Cohort makespan simulator. Before launching a 2,000-sample run, answer "how
+# long on N cpushort nodes, and at which thread count?". Per-sample wall / RSS come from
+# model.yaml + the sample sheet (same predictions as predict_resources.py, record counts
+# resolved once). For every (threads, nodes) candidate a discrete-event simulation
+# replays the cohort: each job becomes eligible after a sampled queue wait, is placed
+# first-fit on a node with enough free cores and memory (no reservations — like SLURM
+# backfill with accurate time limits), and runs for its predicted wall with lognormal
+# noise taken from the model's prediction intervals. Jobs whose safety-quantile request
+# exceeds the partition time limit or a node's memory can't run there and are counted,
+# not simulated. Reports makespan (mean and p90 over replicates), core utilisation,
+# core-hours and cost per configuration.
+#
+# The event loop is a heap of arrivals / completions over plain lists; a 2,000-job
+# cohort on 16 nodes simulates in a few ms, so hundreds of configurations take seconds.
+#
+# Usage:
+#   python simulate_cohort.py --model model.yaml --samples sample_sheet.tsv
+#       [--threads 4,8,16,32] [--nodes 2,4,8,16] [--node-cores 56] [--node-mem-gb 950]
+#       [--time-limit 2h] [--queue-wait lognormal:300,1.0 | fixed:60 | empirical:waits.txt]
+#       [--order fifo|lpt] [--max-jobs 500] [--replicates 5] [--rate 0.05]
+#       [--output makespan_sweep.tsv]
+
+import argparse
+import csv
+import heapq
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from math import log
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from predict_resources import (bytes_per_record_from_model, count_records, predict_rss,
+                               predict_wall, safety_ratio)
+
+Z95 = 1.6449          # standard-normal 95th percentile, for sigma from the q95/q50 ratio
+
+
+def parse_duration(text):
+    """'2h', '90m', '7200s' or plain seconds -> seconds. Also SLURM 'H:MM:SS' / 'D-HH:MM:SS'."""
+    text = str(text).strip()
+    if text[-1:] in "hms" and text[:-1].replace(".", "").isdigit():
+        return float(text[:-1]) * {"h": 3600, "m": 60, "s": 1}[text[-1]]
+    days = 0
+    if "-" in text:
+        d, text = text.split("-", 1)
+        days = int(d)
+    secs = 0.0
+    for part in text.split(":"):
+        secs = secs * 60 + float(part)
+    return days * 86400 + secs
+
+
+def queue_wait_sampler(spec, rng):
+    """Return f(n) -> n queue waits in seconds from 'fixed:S', 'lognormal:MEDIAN,SIGMA',
+    'exponential:MEAN' or 'empirical:file' (one wait per line, e.g. sacct Start - Eligible)."""
+    kind, _, arg = spec.partition(":")
+    if kind in ("0", "none"):
+        return lambda n: np.zeros(n)
+    if kind == "fixed":
+        return lambda n: np.full(n, float(arg))
+    if kind == "lognormal":
+        med, sigma = (float(x) for x in arg.split(","))
+        return lambda n: rng.lognormal(log(max(med, 1e-9)), sigma, n)
+    if kind == "exponential":
+        return lambda n: rng.exponential(float(arg), n)
+    if kind == "empirical":
+        waits = np.array([parse_duration(l) for l in Path(arg).read_text().split() if l])
+        return lambda n: rng.choice(waits, n)
+    raise SystemExit(f"ERROR: unknown --queue-wait {spec!r}")
+
+
+def wall_sigma(model):
+    """Lognormal sigma of obs/pred from the calibration ratio quantiles (0 if absent)."""
+    qd = (model.get("prediction_intervals") or {}).get("wall_ratio") or {}
+    if "q95" in qd and "q50" in qd and qd["q95"] > qd["q50"] > 0:
+        return log(qd["q95"] / qd["q50"]) / Z95
+    return 0.0
+
+
+def simulate(walls, runtimes, cores, mems, n_nodes, node_cores, node_mem, waits, rank,
+             max_jobs=None):
+    """One replay. Returns (makespan_s, busy_core_s, n_timeouts).
+
+    walls: actual run time per job; runtimes: requested limit (jobs running past it are
+    killed at it); cores: per-job cores (one thread setting per configuration); mems:
+    per-job memory; waits: per-job eligible time; rank: priority (lower first)."""
+    free_c = [node_cores] * n_nodes
+    free_m = [node_mem] * n_nodes
+    events = [(waits[i], 1, i, -1) for i in range(len(walls))]   # (t, kind, job, node)
+    heapq.heapify(events)                                          # kind 0 = completion
+    ready = []              # heap of (rank, job)
+    running = 0
+    t = 0.0
+    busy = 0.0
+    timeouts = 0
+    while events:
+        t = events[0][0]
+        while events and events[0][0] == t:
+            _, kind, j, node = heapq.heappop(events)
+            if kind == 0:
+                free_c[node] += cores
+                free_m[node] += mems[j]
+                running -= 1
+            else:
+                heapq.heappush(ready, (rank[j], j))
+        # Every job needs the same cores, so once no node has them nothing further down
+        # the queue fits either; a job that only lacks memory is set aside (backfill)
+        skipped = []
+        while ready and not (max_jobs and running >= max_jobs) and max(free_c) >= cores:
+            item = heapq.heappop(ready)
+            j = item[1]
+            for node in range(n_nodes):
+                if free_c[node] >= cores and free_m[node] >= mems[j]:
+                    free_c[node] -= cores
+                    free_m[node] -= mems[j]
+                    dur = walls[j]
+                    if dur > runtimes[j]:
+                        dur = runtimes[j]
+                        timeouts += 1
+                    busy += dur * cores
+                    heapq.heappush(events, (t + dur, 0, j, node))
+                    running += 1
+                    break
+            else:
+                skipped.append(item)
+        for item in skipped:
+            heapq.heappush(ready, item)
+    return t, busy, timeouts
+
+
+def run_config(pred, threads, n_nodes, args, sampler, sigma, rng):
+    walls_pred, runtime, mem = pred["wall"][threads], pred["runtime"][threads], pred["mem"]
+    fits = (runtime <= args.time_limit_s) & (mem <= args.node_mem_gb) & (threads <= args.node_cores)
+    idx = np.flatnonzero(fits)
+    n = len(idx)
+    out = {"threads": threads, "nodes": n_nodes, "n_jobs": n, "n_unschedulable": int((~fits).sum())}
+    if not n:
+        return {**out, "makespan_h": np.nan, "makespan_p90_h": np.nan, "utilisation": np.nan,
+                "core_hours": np.nan, "cost_usd": np.nan, "timeouts": 0}
+    order = np.argsort(-walls_pred[idx], kind="stable") if args.order == "lpt" else np.arange(n)
+    rank = np.empty(n, dtype=int)
+    rank[order] = np.arange(n)
+    mems = mem[idx].tolist()
+    spans, busys, touts = [], [], []
+    for _ in range(args.replicates):
+        noise = rng.lognormal(0, sigma, n) if sigma else np.ones(n)
+        walls = (walls_pred[idx] * noise).tolist()
+        span, busy, to = simulate(walls, runtime[idx].tolist(), threads, mems, n_nodes,
+                                  args.node_cores, args.node_mem_gb, sampler(n).tolist(),
+                                  rank.tolist(), args.max_jobs)
+        spans.append(span)
+        busys.append(busy)
+        touts.append(to)
+    span = float(np.mean(spans))
+    core_h = float(np.mean(busys)) / 3600
+    return {**out, "makespan_h": span / 3600,
+            "makespan_p90_h": float(np.quantile(spans, 0.9)) / 3600,
+            "utilisation": float(np.mean(busys)) / (n_nodes * args.node_cores * span) if span else np.nan,
+            "core_hours": core_h, "cost_usd": core_h * args.rate,
+            "timeouts": float(np.mean(touts))}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", required=True, help="model.yaml from fit_model.py")
+    p.add_argument("--samples", required=True, help="Sample sheet with 'sample' and 'path' columns")
+    p.add_argument("--output", default="makespan_sweep.tsv")
+    p.add_argument("--threads", default="1,2,4,8,16,32", help="Candidate thread counts")
+    p.add_argument("--nodes", default="1,2,4,8,16", help="Candidate node counts")
+    p.add_argument("--node-cores", type=int, default=56, help="cpushort: 56")
+    p.add_argument("--node-mem-gb", type=float, default=950,
+                   help="Schedulable memory per node (cpushort has ~1 TB)")
+    p.add_argument("--time-limit", default="2h", help="Partition time limit (cpushort: 2h)")
+    p.add_argument("--queue-wait", default="lognormal:120,1.0",
+                   help="fixed:S | lognormal:MEDIAN_S,SIGMA | exponential:MEAN_S | empirical:file")
+    p.add_argument("--order", choices=["fifo", "lpt"], default="fifo",
+                   help="Priority among eligible jobs: sheet order, or longest predicted first")
+    p.add_argument("--max-jobs", type=int, default=None, help="Per-user running-job cap (QOS MaxJobs)")
+    p.add_argument("--quantile", type=float, default=0.95,
+                   help="Safety quantile for the requested runtime / memory")
+    p.add_argument("--wall-model", default=None,
+                   help="wall_model_v1 | wall_model_v2 | wall_model_cv (default: recommended_model)")
+    p.add_argument("--replicates", type=int, default=5, help="Replays per configuration")
+    p.add_argument("--rate", type=float, default=0.05, help="$ per allocated core-hour")
+    p.add_argument("--bytes-per-record", type=float, default=None)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--jobs", type=int, default=32, help="Parallel sample resolvers")
+    args = p.parse_args()
+    args.time_limit_s = parse_duration(args.time_limit)
+
+    model = yaml.safe_load(Path(args.model).read_text())
+    wall_model = args.wall_model or model.get("recommended_model", "wall_model_v1")
+    if wall_model not in model:
+        print(f"ERROR: {wall_model} not in {args.model}", file=sys.stderr)
+        sys.exit(1)
+    if not (model.get("joint_wall_model") and model.get("thread_scaling")):
+        print("WARNING: model.yaml has no thread_scaling / joint_wall_model — wall will not "
+              "change with threads (run fit_model.py --thread-sweep-csv)", file=sys.stderr)
+    bpr = args.bytes_per_record or bytes_per_record_from_model(model)
+    thread_list = [int(t) for t in args.threads.split(",")]
+    node_list = [int(n) for n in args.nodes.split(",")]
+
+    delim = "," if args.samples.endswith(".csv") else "\t"
+    with open(args.samples) as f:
+        samples = list(csv.DictReader(f, delimiter=delim))
+    with ThreadPoolExecutor(max_workers=args.jobs) as ex:
+        counts = list(ex.map(lambda r: count_records(r, bpr), samples))
+    counts = [(n, size) for n, size, src in counts if n is not None]
+    if len(counts) < len(samples):
+        print(f"WARNING: {len(samples) - len(counts)} samples without a record count skipped",
+              file=sys.stderr)
+    print(f"Loaded {len(counts)} samples from {args.samples}; wall model {wall_model}")
+    no_size = sum(size is None for _, size in counts)
+    if no_size and wall_model == "wall_model_v2":
+        print(f"WARNING: input file missing or unreadable for {no_size} samples; wall_model_v2 "
+              f"uses " + ("N × bytes_per_record" if bpr else "wall_model_v1") + " for them",
+              file=sys.stderr)
+
+    # Predictions once per thread count; the sweep over nodes / replicates reuses them
+    wall_q = safety_ratio(model, "wall_ratio", args.quantile, wall_model)
+    rss_q = safety_ratio(model, "rss_ratio", args.quantile)
+    pred = {"wall": {}, "runtime": {},
+            "mem": np.array([max(predict_rss(model, n)[0], 0.1) * rss_q for n, _ in counts])}
+    for t in thread_list:
+        w = np.array([predict_wall(model, wall_model, n, size, t, bpr, mem_gb=m)
+                      for (n, size), m in zip(counts, pred["mem"])])
+        pred["wall"][t] = w
+        pred["runtime"][t] = w * wall_q
+    sigma = wall_sigma(model)
+    rng = np.random.default_rng(args.seed)
+    sampler = queue_wait_sampler(args.queue_wait, rng)
+
+    results = [run_config(pred, t, n, args, sampler, sigma, rng)
+               for t in thread_list for n in node_list]
+    # Configurations that leave samples unschedulable rank below those that run them all
+    results.sort(key=lambda r: (r["n_unschedulable"], np.nan_to_num(r["makespan_h"], nan=np.inf),
+                                r["cost_usd"]))
+
+    cols = ["threads", "nodes", "n_jobs", "n_unschedulable", "makespan_h", "makespan_p90_h",
+            "utilisation", "core_hours", "cost_usd", "timeouts"]
+    with open(args.output, "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(cols)
+        for r in results:
+            w.writerow([f"{r[c]:.4g}" if isinstance(r[c], float) else r[c] for c in cols])
+
+    print(f"[simulate] {len(results)} configurations × {args.replicates} replicates, "
+          f"queue wait {args.queue_wait}, wall noise sigma={sigma:.3f} -> {args.output}")
+    print(f"  {'threads':>7} {'nodes':>5} {'makespan_h':>10} {'p90_h':>7} {'util':>5} "
+          f"{'core_h':>8} {'$':>8}  unschedulable")
+    for r in results[:10]:
+        print(f"  {r['threads']:>7} {r['nodes']:>5} {r['makespan_h']:>10.2f} "
+              f"{r['makespan_p90_h']:>7.2f} {r['utilisation']:>5.0%} {r['core_hours']:>8.1f} "
+              f"{r['cost_usd']:>8.2f}  {r['n_unschedulable']}")
+    for n in node_list:
+        best = next((r for r in results if r["nodes"] == n and r["n_jobs"]), None)
+        if best:
+            print(f"  best on {n} node(s): threads={best['threads']}  "
+                  f"makespan {best['makespan_h']:.2f} h  ${best['cost_usd']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Feed production Snakemake runs back into the resource models. Collects the
+# per-rule `benchmark:` TSVs (columns s, max_rss, io_in, io_out, … — one row per repeat)
+# from a results tree, works out rule and sample from each file name, joins the sample's
+# input size from the sample sheet, and writes one benchmark table in the
+# runtime-resource-study schema (run_id, wall_s, peak_rss_kb, primary_records,
+# file_size_bytes, …) plus one per rule. Each rule with enough observations is then fit
+# with fit_model.py (in parallel), giving <output-dir>/<rule>.model.yaml and an index
+# (<output-dir>/rules.tsv: observations, size unit, model path, status per rule). Re-run
+# it after every production run: the tree is re-scanned, so the models keep refining.
+#
+# File names: benchmarks/<rule>_<sample>.tsv (the snakemake skill's layout; the sample
+# is matched against the sample sheet, so rules and samples may contain underscores) or
+# benchmarks/<rule>/<sample>.tsv. Anything else: --pattern with (?P<rule>…) and
+# (?P<sample>…) groups, matched against the path relative to --root.
+#
+# Size: primary_records / n_records from the sample sheet when present; otherwise the
+# summed size of the sample's input files (--path-cols), in which case the rule's model
+# is per byte (size_unit: bytes in rules.tsv) rather than per record.
+#
+# Usage:
+#   python snakemake_bench_ingest.py --root results/ --samples samples.tsv
+#       [--sample-col sample] [--path-cols path] [--pattern REGEX] [--glob '**/benchmarks/**/*.tsv']
+#       [--output-dir smk_models] [--min-obs 5] [--threads 16] [--no-fit]
+
+import argparse
+import csv
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from bench_io import STR, read_columns, read_header
+
+SCRIPTS = Path(__file__).resolve().parent
+OUT_COLUMNS = ["run_id", "rule", "sample", "repeat", "host", "threads", "wall_s",
+               "peak_rss_kb", "primary_records", "file_size_bytes", "io_in_mb", "io_out_mb",
+               "cpu_time_s", "mean_load", "source"]
+RECORD_COLS = ("primary_records", "n_records")
+
+
+def _num(text):
+    try:
+        v = float(text)
+    except (TypeError, ValueError):
+        return None
+    return v if np.isfinite(v) else None
+
+
+def read_bench_tsv(path):
+    """Rows of one Snakemake benchmark file as dicts of floats (None for NA / '-')."""
+    try:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f, delimiter="\t"))
+    except (OSError, csv.Error):
+        return []
+    return [{k: _num(v) for k, v in r.items() if k and k != "h:m:s"} for r in rows]
+
+
+def load_samples(path, sample_col, path_cols, threads):
+    """sample -> {records, size_bytes}. Input files are stat'ed in a thread pool."""
+    header = read_header(path)
+    if sample_col not in header:
+        raise SystemExit(f"ERROR: {path} has no '{sample_col}' column (--sample-col)")
+    path_cols = [c for c in path_cols if c in header]
+    cols = {c: STR for c in [sample_col] + path_cols + [c for c in RECORD_COLS if c in header]}
+    table = read_columns(path, cols)
+    samples = {}
+    files = []
+    for i, s in enumerate(table[sample_col]):
+        rec = next((_num(table[c][i]) for c in RECORD_COLS if c in table and _num(table[c][i])),
+                   None)
+        paths = [p for c in path_cols for p in str(table[c][i]).replace(";", ",").split(",")
+                 if p.strip()]
+        samples[s] = {"records": rec, "size_bytes": None, "paths": [p.strip() for p in paths]}
+        files += samples[s]["paths"]
+
+    def size(p):
+        try:
+            return p, os.path.getsize(p)
+        except OSError:
+            return p, None
+
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        sizes = dict(ex.map(size, set(files)))
+    for s in samples.values():
+        got = [sizes[p] for p in s["paths"] if sizes.get(p) is not None]
+        s["size_bytes"] = float(sum(got)) if got else None
+    return samples
+
+
+def rule_and_sample(rel, samples, pattern):
+    """(rule, sample) for a benchmark path relative to --root, or None."""
+    if pattern:
+        m = pattern.search(rel)
+        return (m.group("rule"), m.group("sample")) if m else None
+    p = Path(rel)
+    stem = p.name[:-4] if p.name.endswith(".tsv") else p.stem
+    if p.parent.name != "benchmarks" and stem in samples:
+        return p.parent.name, stem
+    # <rule>_<sample>: longest sample id that is a suffix wins
+    best = None
+    for i in range(1, len(stem)):
+        if stem[i - 1] == "_" and stem[i:] in samples:
+            best = (stem[:i - 1], stem[i:])
+            break
+    return best
+
+
+def collect(root, glob, samples, pattern, threads):
+    """Benchmark rows for every matching file under root, read in a thread pool."""
+    paths = sorted(Path(root).glob(glob))
+    keyed, unmatched = [], 0
+    for path in paths:
+        key = rule_and_sample(str(path.relative_to(root)), samples, pattern)
+        if key is None:
+            unmatched += 1
+        else:
+            keyed.append((key, path))
+    rows = []
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        for ((rule, sample), path), bench in zip(keyed, ex.map(read_bench_tsv,
+                                                             [p for _, p in keyed])):
+            info = samples.get(sample, {})
+            for rep, b in enumerate(bench, 1):
+                if b.get("s") is None:
+                    continue
+                rss_mb = b.get("max_rss")
+                rows.append({
+                    "run_id": f"{rule}:{sample}_r{rep}", "rule": rule, "sample": sample,
+                    "repeat": rep, "host": "", "threads": "",
+                    "wall_s": b["s"],
+                    "peak_rss_kb": rss_mb * 1024 if rss_mb is not None else None,
+                    "primary_records": info.get("records"),
+                    "file_size_bytes": info.get("size_bytes"),
+                    "io_in_mb": b.get("io_in"), "io_out_mb": b.get("io_out"),
+                    "cpu_time_s": b.get("cpu_time"), "mean_load": b.get("mean_load"),
+                    "source": str(path),
+                })
+    return rows, len(paths), unmatched
+
+
+def write_rows(path, rows):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(OUT_COLUMNS)
+        for r in rows:
+            w.writerow(["" if r[c] is None else (f"{r[c]:.3f}" if isinstance(r[c], float) else r[c])
+                        for c in OUT_COLUMNS])
+
+
+def size_unit(rows):
+    """'records' if every row has a record count, 'bytes' if every row has an input
+    size, else None (the rule can't be fit on a single consistent axis)."""
+    if all(r["primary_records"] is not None for r in rows):
+        return "records"
+    if all(r["file_size_bytes"] is not None for r in rows):
+        return "bytes"
+    return None
+
+
+def fit_rule(task):
+    """Run fit_model.py on one rule's CSV; returns (rule, returncode, last stderr line)."""
+    rule, csv_path, model_path = task
+    r = subprocess.run([sys.executable, str(SCRIPTS / "fit_model.py"), "--csv", str(csv_path),
+                        "--output", str(model_path)], capture_output=True, text=True, check=False)
+    err = r.stderr.strip().splitlines()
+    return rule, r.returncode, err[-1] if err else ""
+
+
+def _slug(rule):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", rule)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--root", required=True, help="Results tree to scan")
+    p.add_argument("--samples", required=True, help="Sample sheet (.csv / .tsv)")
+    p.add_argument("--sample-col", default="sample")
+    p.add_argument("--path-cols", default="path",
+                   help="Comma-separated sample-sheet column(s) holding input file path(s)")
+    p.add_argument("--glob", default="**/benchmarks/**/*.tsv",
+                   help="Benchmark files under --root (default: **/benchmarks/**/*.tsv)")
+    p.add_argument("--pattern", default=None,
+                   help="Regex with (?P<rule>) and (?P<sample>) groups, for other layouts")
+    p.add_argument("--output-dir", default="smk_models")
+    p.add_argument("--min-obs", type=int, default=5,
+                   help="Observations (and distinct samples >= 3) needed to fit a rule")
+    p.add_argument("--threads", type=int, default=16, help="Threads for file reads and fits")
+    p.add_argument("--no-fit", action="store_true", help="Only write the benchmark tables")
+    args = p.parse_args()
+
+    pattern = re.compile(args.pattern) if args.pattern else None
+    samples = load_samples(args.samples, args.sample_col, args.path_cols.split(","), args.threads)
+    rows, n_files, unmatched = collect(args.root, args.glob, samples, pattern, args.threads)
+    print(f"[ingest] {n_files} benchmark files, {len(rows)} rows "
+          f"({unmatched} files with no rule/sample match) from {args.root}")
+    if not rows:
+        raise SystemExit("ERROR: no benchmark rows — check --glob / --pattern / --sample-col")
+    no_size = sorted({r["sample"] for r in rows if r["primary_records"] is None
+                      and r["file_size_bytes"] is None})
+    if no_size:
+        print(f"WARNING: {len(no_size)} samples have no records or input size "
+              f"(e.g. {', '.join(no_size[:3])})", file=sys.stderr)
+
+    out = Path(args.output_dir)
+    (out / "per_rule").mkdir(parents=True, exist_ok=True)
+    write_rows(out / "snakemake_benchmarks.csv", rows)
+    by_rule = {}
+    for r in rows:
+        by_rule.setdefault(r["rule"], []).append(r)
+
+    index, tasks = [], []
+    for rule, rr in sorted(by_rule.items()):
+        unit = size_unit(rr)
+        if unit == "bytes":
+            # fit_model.py fits on primary_records; put the byte count there so the
+            # coefficients come out per byte (recorded as size_unit in rules.tsv), and
+            # drop the size column so the 2-term model isn't fit on a copy of N
+            rr = [dict(r, primary_records=r["file_size_bytes"], file_size_bytes=None)
+                  for r in rr]
+        csv_path = out / "per_rule" / f"{_slug(rule)}.csv"
+        write_rows(csv_path, rr)
+        n_samples = len({r["sample"] for r in rr})
+        entry = {"rule": rule, "n_obs": len(rr), "n_samples": n_samples, "size_unit": unit or "",
+                 "wall_med_s": float(np.median([r["wall_s"] for r in rr])),
+                 "rss_max_gb": max((r["peak_rss_kb"] or 0) for r in rr) / 1024 ** 2,
+                 "model": "", "status": ""}
+        if unit is None:
+            entry["status"] = "no_size"
+        elif len(rr) < args.min_obs or n_samples < 3:
+            entry["status"] = "too_few"
+        elif args.no_fit:
+            entry["status"] = "not_fit"
+        else:
+            model_path = out / f"{_slug(rule)}.model.yaml"
+            entry["model"] = str(model_path)
+            tasks.append((rule, csv_path, model_path))
+        index.append(entry)
+
+    if tasks:
+        with ThreadPoolExecutor(max_workers=args.threads) as ex:
+            results = {rule: (rc, err) for rule, rc, err in ex.map(fit_rule, tasks)}
+        for e in index:
+            if e["rule"] in results:
+                rc, err = results[e["rule"]]
+                e["status"] = "fit" if rc == 0 else "fit_failed"
+                if rc != 0:
+                    e["model"] = ""
+                    print(f"WARNING: fit_model.py failed for {e['rule']}: {err}", file=sys.stderr)
+
+    with open(out / "rules.tsv", "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        cols = ["rule", "n_obs", "n_samples", "size_unit", "wall_med_s", "rss_max_gb", "model",
+                "status"]
+        w.writerow(cols)
+        for e in index:
+            w.writerow([f"{e[c]:.3f}" if isinstance(e[c], float) else e[c] for c in cols])
+    print(f"[write] {out / 'snakemake_benchmarks.csv'}, {len(index)} per-rule tables, "
+          f"{out / 'rules.tsv'}")
+    for e in index:
+        print(f"  {e['rule']:<28} n={e['n_obs']:<5} samples={e['n_samples']:<4} "
+              f"wall_med={e['wall_med_s']:>8.1f}s  rss_max={e['rss_max_gb']:.2f}GB  {e['status']}")
+
+
+if __name__ == "__main__":
+    main()
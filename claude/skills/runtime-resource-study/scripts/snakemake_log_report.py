@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# Author: claude (skill bundled)
+# Date: 2026-10-19
+# Purpose: Per-rule timing, critical path and parallelism from a finished Snakemake run's
+# logs, without re-running anything. Streams the coordinator log(s)
+# (.snakemake/log/*.snakemake.log) for each job's rule, wildcards, inputs/outputs, submit
+# time, SLURM job id and finish time (and failed / restarted attempts), then reads the
+# per-job executor logs (slurm_logs/rule_<rule>/<jobid>.log) in a thread pool for when the
+# job actually started and stopped on the node. That splits every attempt into
+#   queue wait = job-log start − coordinator submit      runtime = job-log end − start
+# Each log is read line by line and only timestamp / rule / finish lines are kept, so a
+# run with thousands of jobs is a few seconds of I/O.
+#
+# The job DAG is rebuilt by matching each job's inputs to other jobs' outputs. The
+# critical path is traced backwards from the last job to finish: at each step the
+# predecessor that finished last is the one the job was waiting on. Per rule, the report
+# gives max and time-averaged concurrency (jobs running on nodes at once) — a rule with
+# hundreds of jobs but a concurrency of 3 is bound by the scheduler or --jobs, not by
+# its resources.
+#
+# Outputs (<prefix>.jobs.tsv, <prefix>.rules.tsv, <prefix>.critical_path.tsv): one row
+# per attempt, one row per rule (pooled over all runs given), and the critical path of
+# each run.
+#
+# Usage:
+#   python snakemake_log_report.py [--log-dir .snakemake/log | --log <file> ...]
+#       [--slurm-logs .snakemake/slurm_logs] [--latest] [--threads 16]
+#       [--output-prefix smk_report]
+
+import argparse
+import csv
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+TS_RE = re.compile(r"^\[(\w{3} \w{3} +\d+ \d\d:\d\d:\d\d \d{4})\]\s*$")
+RULE_RE = re.compile(r"^(local)?rule (\S+):\s*$")
+FIELD_RE = re.compile(r"^\s+(input|output|jobid|wildcards|threads): (.*)$")
+SUBMIT_RE = (
+    re.compile(r"^Job (\d+) has been submitted with SLURM jobid (\d+)(?: \(log: (.*)\))?"),
+    re.compile(r"^Submitted (?:group )?job (\d+) with external jobid '(?:Submitted batch job )?(\d+)"),
+)
+FINISH_RE = (re.compile(r"^Finished jobid: (\d+)"), re.compile(r"^Finished job (\d+)\."))
+ERROR_RE = re.compile(r"^Error in rule (\S+):")
+HOST_RE = re.compile(r"^host: (\S+)")
+
+JOB_COLUMNS = ["run", "jobid", "attempt", "rule", "wildcards", "threads", "slurm_jobid", "host",
+               "status", "submit", "start", "end", "queue_s", "runtime_s", "lag_s",
+               "total_s", "on_critical_path"]
+RULE_COLUMNS = ["rule", "n_jobs", "n_attempts", "n_retries", "n_failed", "queue_median_s",
+                "queue_p90_s", "runtime_median_s", "runtime_p90_s", "runtime_max_s",
+                "runtime_total_s", "max_concurrent", "mean_concurrent", "critical_path_s"]
+PATH_COLUMNS = ["run", "step", "jobid", "rule", "wildcards", "submit", "end", "gap_s",
+                "queue_s", "runtime_s", "total_s"]
+
+
+@lru_cache(maxsize=None)
+def parse_ts(text):
+    """'Thu Feb 26 09:52:43 2026' -> epoch seconds (local time; only differences matter)."""
+    return datetime.strptime(" ".join(text.split()), "%a %b %d %H:%M:%S %Y").timestamp()
+
+
+def _split_files(text):
+    return [os.path.normpath(f.strip()) for f in text.split(",") if f.strip()]
+
+
+def _new_attempt(ts):
+    return {"submit": ts, "slurm_jobid": "", "log": "", "end": None, "status": "running"}
+
+
+def parse_main_log(path):
+    """jobid -> {rule, local, wildcards, threads, inputs, outputs, attempts[]} for one
+    coordinator log. A job printed again under the same jobid (--retries) is a new
+    attempt; 'Error in rule … jobid: N' marks the current attempt failed."""
+    jobs = {}
+    ts = None
+    block, block_rule, block_fields, block_ts = None, None, {}, None
+
+    def close_block():
+        if block is None or "jobid" not in block_fields:
+            return
+        jid = int(block_fields["jobid"])
+        if block == "error":
+            job = jobs.get(jid)
+            if job and job["attempts"]:
+                att = job["attempts"][-1]
+                att["status"] = "failed"
+                if att["end"] is None:
+                    att["end"] = block_ts
+            return
+        job = jobs.get(jid)
+        if job is None:
+            job = jobs[jid] = {"rule": block_rule, "local": block == "local",
+                               "wildcards": block_fields.get("wildcards", ""),
+                               "threads": block_fields.get("threads", ""),
+                               "inputs": _split_files(block_fields.get("input", "")),
+                               "outputs": _split_files(block_fields.get("output", "")),
+                               "attempts": []}
+        job["attempts"].append(_new_attempt(block_ts))
+
+    with open(path, errors="replace") as f:
+        for line in f:
+            m = TS_RE.match(line)
+            if m:
+                close_block()
+                block = None
+                ts = parse_ts(m.group(1))
+                continue
+            if block is not None:
+                m = FIELD_RE.match(line)
+                if m:
+                    block_fields[m.group(1)] = m.group(2).strip()
+                    continue
+                if line.startswith((" ", "\t")):
+                    continue
+                close_block()
+                block = None
+            m = RULE_RE.match(line)
+            if m:
+                block, block_rule, block_fields = ("local" if m.group(1) else "rule"), m.group(2), {}
+                block_ts = ts
+                continue
+            m = ERROR_RE.match(line)
+            if m:
+                block, block_rule, block_fields = "error", m.group(1), {}
+                block_ts = ts
+                continue
+            for rx in SUBMIT_RE:
+                m = rx.match(line)
+                if m:
+                    job = jobs.get(int(m.group(1)))
+                    if job and job["attempts"]:
+                        att = job["attempts"][-1]
+                        att["slurm_jobid"] = m.group(2)
+                        att["log"] = (m.groups()[2:] or [None])[0] or ""
+                    break
+            else:
+                for rx in FINISH_RE:
+                    m = rx.match(line)
+                    if m:
+                        job = jobs.get(int(m.group(1)))
+                        if job and job["attempts"]:
+                            job["attempts"][-1].update(end=ts, status="ok")
+                        break
+        close_block()
+    return jobs
+
+
+def parse_job_log(path):
+    """(host, start, end, failed) from one executor log: start is the first rule
+    header's timestamp on the node, end the last 'Finished' timestamp."""
+    host, start, end, failed = "", None, None, False
+    ts = None
+    try:
+        with open(path, errors="replace") as f:
+            for line in f:
+                c = line[:1]
+                if c == "[":
+                    m = TS_RE.match(line)
+                    if m:
+                        ts = m.group(1)
+                elif c == "h" and not host:
+                    m = HOST_RE.match(line)
+                    if m:
+                        host = m.group(1)
+                elif start is None and RULE_RE.match(line):
+                    start = ts
+                elif line.startswith("Finished job"):
+                    end = ts
+                elif line.startswith("Error in rule"):
+                    failed = True
+                    end = end or ts
+    except OSError:
+        return None
+    return (host, parse_ts(start) if start else None, parse_ts(end) if end else None, failed)
+
+
+def index_job_logs(slurm_dir):
+    """SLURM job id -> path for every <jobid>.log under slurm_dir (one scandir walk)."""
+    index = {}
+    if not slurm_dir or not os.path.isdir(slurm_dir):
+        return index
+    stack = [slurm_dir]
+    while stack:
+        for e in os.scandir(stack.pop()):
+            if e.is_dir(follow_symlinks=False):
+                stack.append(e.path)
+            elif e.name.endswith(".log"):
+                index[e.name[:-4]] = e.path
+    return index
+
+
+def attach_job_logs(runs, slurm_dir, threads):
+    """Fill host / start / end of every submitted attempt from its executor log."""
+    index = index_job_logs(slurm_dir)
+    todo = []
+    for jobs in runs.values():
+        for job in jobs.values():
+            for att in job["attempts"]:
+                if not att["slurm_jobid"]:
+                    continue
+                path = index.get(att["slurm_jobid"])
+                if path is None and att["log"] and os.path.exists(att["log"]):
+                    path = att["log"]
+                if path:
+                    todo.append((att, path))
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        for (att, _), res in zip(todo, ex.map(parse_job_log, [p for _, p in todo])):
+            if res is None:
+                continue
+            att["host"], att["start"], end, failed = res
+            if end is not None:
+                att["node_end"] = end
+            if failed and att["status"] != "ok":
+                att["status"] = "failed"
+    return len(todo), len(index)
+
+
+def attempt_times(job, att):
+    """(queue_s, runtime_s, total_s) for one attempt; None where unknown. Local rules
+    have no queue; without an executor log the whole submit→finish span is total only."""
+    total = att["end"] - att["submit"] if att["end"] is not None and att["submit"] is not None \
+        else None
+    if job["local"]:
+        return 0.0, total, total
+    start = att.get("start")
+    if start is None or att["submit"] is None:
+        return None, None, total
+    end = att.get("node_end", att["end"])
+    return (max(start - att["submit"], 0.0),
+            max(end - start, 0.0) if end is not None else None, total)
+
+
+def dependencies(jobs):
+    """jobid -> set of jobids it consumed outputs from."""
+    producer = {}
+    for jid, job in jobs.items():
+        for f in job["outputs"]:
+            producer[f] = jid
+    return {jid: {producer[f] for f in job["inputs"] if f in producer and producer[f] != jid}
+            for jid, job in jobs.items()}
+
+
+def critical_path(jobs):
+    """Walk back from the last job to finish, always taking the predecessor that
+    finished last. Returns [jobid, …] in execution order."""
+    done = {jid: job["attempts"][-1]["end"] for jid, job in jobs.items()
+            if job["attempts"] and job["attempts"][-1]["end"] is not None}
+    if not done:
+        return []
+    deps = dependencies(jobs)
+    last = lambda jid: (done[jid], jobs[jid]["attempts"][-1]["submit"] or 0)
+    path = [max(done, key=last)]
+    seen = set(path)
+    while True:
+        preds = [d for d in deps[path[-1]] if d in done and d not in seen]
+        if not preds:
+            break
+        path.append(max(preds, key=last))
+        seen.add(path[-1])
+    return path[::-1]
+
+
+def lag(queue, runtime, total):
+    """Seconds between the job ending on its node and the coordinator noticing
+    (executor status polling) — part of total_s that is neither queue nor runtime."""
+    if None in (queue, runtime, total):
+        return None
+    return max(total - queue - runtime, 0.0)
+
+
+def concurrency(by_run):
+    """(max, time-averaged) number of overlapping [start, end) intervals. by_run maps
+    run -> intervals; runs are swept separately so the idle time between runs doesn't
+    dilute the average."""
+    peak, busy, span = 0, 0.0, 0.0
+    for intervals in by_run.values():
+        # At equal times: ends of real intervals, then starts, then ends of zero-length
+        # ones — back-to-back jobs don't overlap, but an instant job still counts once
+        events = sorted([(s, 1, 1) for s, _ in intervals]
+                        + [(e, 0 if e > s else 2, -1) for s, e in intervals])
+        cur = 0
+        for _, _, d in events:
+            cur += d
+            peak = max(peak, cur)
+        busy += sum(e - s for s, e in intervals)
+        span += max(e for _, e in intervals) - min(s for s, _ in intervals)
+    return peak, (busy / span if span > 0 else float(peak))
+
+
+def _fmt_ts(t):
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%dT%H:%M:%S") if t is not None else ""
+
+
+def _fmt(v, nd=1):
+    return "" if v is None else f"{v:.{nd}f}"
+
+
+def _q(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def main_logs(args):
+    if args.log:
+        logs = [Path(p) for p in args.log]
+    else:
+        logs = sorted(Path(args.log_dir).glob("*.snakemake.log"))
+    if not logs:
+        raise SystemExit(f"ERROR: no *.snakemake.log under {args.log_dir}")
+    return logs[-1:] if args.latest else logs
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--log-dir", default=".snakemake/log", help="Directory of *.snakemake.log")
+    p.add_argument("--log", nargs="+", default=None, help="Explicit coordinator log(s)")
+    p.add_argument("--latest", action="store_true", help="Only the newest coordinator log")
+    p.add_argument("--slurm-logs", default=None,
+                   help="Executor log tree (default: <log-dir>/../slurm_logs)")
+    p.add_argument("--threads", type=int, default=16, help="Threads reading executor logs")
+    p.add_argument("--output-prefix", default="smk_report")
+    args = p.parse_args()
+
+    logs = main_logs(args)
+    runs = {}
+    for path in logs:
+        runs[path.name.replace(".snakemake.log", "")] = parse_main_log(path)
+    slurm_dir = args.slurm_logs or str(Path(logs[0]).resolve().parent.parent / "slurm_logs")
+    n_read, n_indexed = attach_job_logs(runs, slurm_dir, args.threads)
+    n_jobs = sum(len(j) for j in runs.values())
+    print(f"[logs] {len(runs)} runs, {n_jobs} jobs; {n_read} executor logs read "
+          f"({n_indexed} indexed under {slurm_dir})")
+
+    per_rule = {}
+    path_rows = []
+    job_rows = []
+    for run, jobs in runs.items():
+        cpath = critical_path(jobs)
+        on_path = set(cpath)
+        prev_end = None
+        for step, jid in enumerate(cpath, 1):
+            job = jobs[jid]
+            att = job["attempts"][-1]
+            q, r, t = attempt_times(job, att)
+            gap = att["submit"] - prev_end if prev_end is not None and att["submit"] is not None \
+                else None
+            prev_end = att["end"]
+            path_rows.append([run, step, jid, job["rule"], job["wildcards"], _fmt_ts(att["submit"]),
+                              _fmt_ts(att["end"]), _fmt(gap), _fmt(q), _fmt(r), _fmt(t)])
+            if t is not None:
+                per_rule.setdefault(job["rule"], {}).setdefault("critical", []).append(t)
+        for jid, job in sorted(jobs.items()):
+            s = per_rule.setdefault(job["rule"], {})
+            s["n_jobs"] = s.get("n_jobs", 0) + 1
+            for k, att in enumerate(job["attempts"], 1):
+                q, r, t = attempt_times(job, att)
+                s.setdefault("attempts", []).append(att["status"])
+                if q is not None:
+                    s.setdefault("queue", []).append(q)
+                if r is not None:
+                    s.setdefault("runtime", []).append(r)
+                    start = att.get("start", att["submit"])
+                    s.setdefault("intervals", {}).setdefault(run, []).append((start, start + r))
+                job_rows.append([run, jid, k, job["rule"], job["wildcards"], job["threads"],
+                                 att["slurm_jobid"], att.get("host", ""), att["status"],
+                                 _fmt_ts(att["submit"]), _fmt_ts(att.get("start")),
+                                 _fmt_ts(att.get("node_end", att["end"])),
+                                 _fmt(q), _fmt(r), _fmt(lag(q, r, t)), _fmt(t),
+                                 int(jid in on_path)])
+
+    prefix = args.output_prefix
+    with open(f"{prefix}.jobs.tsv", "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(JOB_COLUMNS)
+        w.writerows(job_rows)
+    with open(f"{prefix}.rules.tsv", "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(RULE_COLUMNS)
+        for rule, s in sorted(per_rule.items(), key=lambda kv: -sum(kv[1].get("runtime", []))):
+            runtime, queue = s.get("runtime", []), s.get("queue", [])
+            attempts = s.get("attempts", [])
+            peak, mean = concurrency(s.get("intervals", {}))
+            w.writerow([rule, s.get("n_jobs", 0), len(attempts), len(attempts) - s.get("n_jobs", 0),
+                        attempts.count("failed"), _fmt(_q(queue, 50)), _fmt(_q(queue, 90)),
+                        _fmt(_q(runtime, 50)), _fmt(_q(runtime, 90)),
+                        _fmt(max(runtime) if runtime else None), _fmt(sum(runtime)),
+                        peak, _fmt(mean, 2), _fmt(sum(s.get("critical", [])))])
+    with open(f"{prefix}.critical_path.tsv", "w", newline="") as f:
+        w = csv.writer(f, delimiter="\t")
+        w.writerow(PATH_COLUMNS)
+        w.writerows(path_rows)
+    print(f"[write] {prefix}.jobs.tsv ({len(job_rows)} attempts), {prefix}.rules.tsv "
+          f"({len(per_rule)} rules), {prefix}.critical_path.tsv")
+
+    for run, jobs in runs.items():
+        steps = [r for r in path_rows if r[0] == run]
+        if not steps:
+            continue
+        att = [a for j in jobs.values() for a in j["attempts"]]
+        t0 = min(a["submit"] for a in att if a["submit"] is not None)
+        t1 = max(a["end"] for a in att if a["end"] is not None)
+        print(f"[critical] {run}: {len(steps)} steps, makespan {t1 - t0:.0f}s")
+        print("  " + " -> ".join(r[3] for r in steps))
+    failed = sum(1 for r in job_rows if r[8] == "failed")
+    if failed:
+        print(f"WARNING: {failed} failed attempts; see {prefix}.jobs.tsv", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()